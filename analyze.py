@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from game import MCTS
+from bitboard import BitboardState
+from parallel import parallel_root_stats
+
+
+def read_positions(lines):
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def analyse_position(job):
+    index, position, iterations, time_limit, options, seed = job
+    record = {"index": index, "position": position}
+    try:
+        state = BitboardState.from_compact(position)
+    except ValueError as error:
+        record["error"] = str(error)
+        return record
+
+    random.seed(seed)
+    workers = options.pop("workers", None)
+    if workers is not None and workers > 1:
+        return analyse_in_parallel(record, state, iterations, time_limit, options, workers)
+
+    engine = MCTS(**options)
+    start = time.perf_counter()
+    root = engine.run(state, iterations, time_limit)
+    record["seconds"] = round(time.perf_counter() - start, 4)
+
+    move = engine.best_move()
+    child = root.children.get(move)
+    record["best_move"] = None if move is None else move[0] * 9 + move[1]
+    record["win_rate"] = round(child.wins / child.visits, 4) if child is not None and child.visits else None
+    record["proven"] = None if child is None else child.proven
+    record["iterations"] = root.visits
+    record["visits"] = {b * 9 + c: node.visits for (b, c), node in sorted(root.children.items())}
+    return record
+
+
+def analyse_in_parallel(record, state, iterations, time_limit, options, workers):
+    start = time.perf_counter()
+    stats = parallel_root_stats(state, iterations, workers, time_limit, **options)
+    record["seconds"] = round(time.perf_counter() - start, 4)
+
+    move = max(stats, key=lambda move: stats[move][0]) if stats else None
+    visits, wins = stats.get(move, (0, 0))
+    record["best_move"] = None if move is None else move[0] * 9 + move[1]
+    record["win_rate"] = round(wins / visits, 4) if visits else None
+    record["proven"] = None
+    record["iterations"] = sum(visits for visits, _ in stats.values())
+    record["visits"] = {b * 9 + c: visits for (b, c), (visits, _) in sorted(stats.items())}
+    return record
+
+
+def analyse_stream(positions, output, pool, iterations, time_limit, options, window, seed):
+    pending = deque()
+    done = 0
+    for index, position in enumerate(positions):
+        if len(pending) >= window:
+            output.write(json.dumps(pending.popleft().result()) + "\n")
+            done += 1
+        job = (index, position, iterations, time_limit, options, seed + index)
+        pending.append(pool.submit(analyse_position, job))
+    while pending:
+        output.write(json.dumps(pending.popleft().result()) + "\n")
+        done += 1
+    output.flush()
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse compact positions in bulk and stream JSONL results in input order")
+    parser.add_argument("input", nargs="?", default="-", help="file with one compact position per line, or - for stdin")
+    parser.add_argument("--out", default="-", help="JSONL output file, or - for stdout")
+    parser.add_argument("--iterations", type=int)
+    parser.add_argument("--time", type=float, help="seconds per position")
+    parser.add_argument("--playout", default="random", choices=("random", "heavy"))
+    parser.add_argument("--rave", type=float, help="RAVE equivalence parameter")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="positions analysed at once")
+    parser.add_argument("--search-workers", type=int, help="root-parallel search processes per position")
+    parser.add_argument("--window", type=int, help="positions in flight at once (default 4 per worker)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.iterations is None and args.time is None:
+        parser.error("--iterations or --time is required")
+
+    options = {"playout": args.playout, "rave_k": args.rave, "workers": args.search_workers}
+    window = args.window or 4 * args.workers
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.out == "-" else open(args.out, "w")
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(args.workers) as pool:
+            done = analyse_stream(
+                read_positions(source), output, pool, args.iterations, args.time, options, window, args.seed
+            )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"analysed {done} positions in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from game import UltimateTTTState, search_tree
+from bitboard import BitboardState
+
+STATE_CLASSES = {"UltimateTTTState": UltimateTTTState, "BitboardState": BitboardState}
+HIGHER_IS_BETTER = ("playouts_per_sec", "make_moves_per_sec", "legal_moves_per_sec", "iterations_per_sec")
+LOWER_IS_BETTER = ("peak_memory_bytes",)
+
+
+def seeded_position(cls, seed, plies, forced=None):
+    rng = random.Random(seed)
+    while True:
+        state = cls()
+        for _ in range(plies):
+            if state.is_terminal():
+                break
+            state.make_move(rng.choice(state.get_legal_moves()))
+        if state.is_terminal():
+            continue
+        if forced is None or (state.next_board is not None) == forced:
+            return state
+
+
+def positions(cls):
+    return {
+        "opening": cls(),
+        "midgame": seeded_position(cls, 1, 24, forced=False),
+        "forced_board": seeded_position(cls, 2, 16, forced=True),
+        "endgame": seeded_position(cls, 3, 48),
+    }
+
+
+def bench_playouts(state, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        playout = state.clone()
+        while not playout.is_terminal():
+            playout.make_move(playout.random_move())
+    return count / (time.perf_counter() - start)
+
+
+def bench_make_move(state, count):
+    rng = random.Random(0)
+    line = state.clone()
+    while not line.is_terminal():
+        line.make_move(rng.choice(line.get_legal_moves()))
+    moves = [record[0] for record in line.history[len(state.history):]]
+
+    line = state.clone()
+    start = time.perf_counter()
+    for _ in range(count):
+        for move in moves:
+            line.make_move(move)
+        for _ in moves:
+            line.unmake_move()
+    return count * len(moves) / (time.perf_counter() - start)
+
+
+def bench_legal_moves(state, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        state.get_legal_moves()
+    return count / (time.perf_counter() - start)
+
+
+def tree_size(root):
+    seen = {id(root)}
+    stack = [root]
+    while stack:
+        for child in stack.pop().children.values():
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return len(seen)
+
+
+def bench_search(state, iterations):
+    start = time.perf_counter()
+    search_tree(state, iterations)
+    iterations_per_sec = iterations / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    root = search_tree(state, iterations)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return iterations_per_sec, peak, tree_size(root)
+
+
+def run_benchmarks(iterations, playouts, seed):
+    results = {}
+    for name, cls in STATE_CLASSES.items():
+        for label, state in positions(cls).items():
+            random.seed(seed)
+            iterations_per_sec, peak, nodes = bench_search(state, iterations)
+            results[f"{name}/{label}"] = {
+                "playouts_per_sec": bench_playouts(state, playouts),
+                "make_moves_per_sec": bench_make_move(state, playouts),
+                "legal_moves_per_sec": bench_legal_moves(state, playouts * 20),
+                "iterations_per_sec": iterations_per_sec,
+                "peak_memory_bytes": peak,
+                "tree_nodes": nodes,
+            }
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "playouts": playouts,
+            "seed": seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for case, metrics in current["results"].items():
+        previous = baseline["results"].get(case)
+        if previous is None:
+            continue
+        for metric, value in metrics.items():
+            old = previous.get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            if metric in HIGHER_IS_BETTER and change < -tolerance:
+                regressions.append((case, metric, old, value, change))
+            elif metric in LOWER_IS_BETTER and change > tolerance:
+                regressions.append((case, metric, old, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless engine benchmarks")
+    parser.add_argument("--iterations", type=int, default=2000, help="mcts iterations per position")
+    parser.add_argument("--playouts", type=int, default=300, help="random playouts per position")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.iterations, args.playouts, args.seed)
+    for case, metrics in report["results"].items():
+        print(case)
+        for metric, value in metrics.items():
+            print(f"  {metric:<22}{value:>14,.0f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for case, metric, old, new, change in regressions:
+            print(f"REGRESSION {case} {metric}: {old:,.0f} -> {new:,.0f} ({change:+.1%})")
+        if regressions:
+            return 1
+        print("No regressions against", args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import random
+from tables import FULL, WINS, POPCOUNT, CELLS, MOVES
+from tables import ZOBRIST_X, ZOBRIST_O, ZOBRIST_SIDE, ZOBRIST_NEXT, zobrist_hash
+
+X, O, DRAW = 1, 2, 3
+COMPACT_NEXT = {"-": None, **{str(b): b for b in range(9)}}
+
+
+def token_tables(tokens):
+    _, x, o, draw = tokens
+    return {x: o, o: x}, {x: ZOBRIST_X, o: ZOBRIST_O}, {None: " ", x: "X", o: "O", draw: "D"}
+
+
+def mask_boards(state):
+    x_masks = state.masks[state.TOKENS[1]]
+    o_masks = state.masks[state.TOKENS[2]]
+    return [
+        ["X" if x_masks[b] >> c & 1 else "O" if o_masks[b] >> c & 1 else " " for c in range(9)]
+        for b in range(9)
+    ]
+
+
+class BitboardState:
+    TOKENS = (None, X, O, DRAW)
+    OPPONENT, ZOBRIST_CELLS, MARKS = token_tables(TOKENS)
+
+    def __init__(self):
+        x, o = self.TOKENS[1:3]
+        self.masks = {x: [0] * 9, o: [0] * 9}
+        self.meta = {x: 0, o: 0}
+        self.closed = 0
+        self.empty = [FULL] * 9
+        self.board_winners = [None] * 9
+        self.current_player = x
+        self.next_board = None
+        self.overall_winner = None
+        self.score_x = 0
+        self.score_o = 0
+        self.draws = 0
+        self.history = []
+        self.zobrist = ZOBRIST_NEXT[None]
+
+    @classmethod
+    def from_compact(cls, text):
+        parts = text.strip().split(":")
+        if (
+            len(parts) != 3
+            or len(parts[0]) != 81
+            or set(parts[0]) - set("XO.")
+            or parts[1] not in COMPACT_NEXT
+            or parts[2] not in ("X", "O")
+        ):
+            raise ValueError(f"invalid compact position {text!r}")
+
+        state = cls()
+        tokens = {"X": state.TOKENS[1], "O": state.TOKENS[2]}
+        for i, mark in enumerate(parts[0]):
+            if mark != ".":
+                b, c = divmod(i, 9)
+                state.masks[tokens[mark]][b] |= 1 << c
+                state.empty[b] ^= 1 << c
+        for b in range(9):
+            state._close_board(b)
+
+        next_board = COMPACT_NEXT[parts[1]]
+        if next_board is not None and state.board_winners[next_board] is not None:
+            next_board = None
+        state.current_player = tokens[parts[2]]
+        state.next_board = next_board
+        state.zobrist = state.compute_zobrist()
+        return state
+
+    def to_compact(self):
+        cells = "".join(mark if mark != " " else "." for board in self.boards for mark in board)
+        next_board = "-" if self.next_board is None else self.next_board
+        return f"{cells}:{next_board}:{self.MARKS[self.current_player]}"
+
+    @property
+    def player_just_moved(self):
+        return self.OPPONENT[self.current_player]
+
+    @property
+    def moves(self):
+        return [record[0] for record in self.history]
+
+    @property
+    def boards(self):
+        return mask_boards(self)
+
+    def clone(self):
+        clone_state = self.__class__.__new__(self.__class__)
+        clone_state.masks = {player: masks[:] for player, masks in self.masks.items()}
+        clone_state.meta = self.meta.copy()
+        clone_state.closed = self.closed
+        clone_state.empty = self.empty[:]
+        clone_state.board_winners = self.board_winners[:]
+        clone_state.current_player = self.current_player
+        clone_state.next_board = self.next_board
+        clone_state.overall_winner = self.overall_winner
+        clone_state.score_x = self.score_x
+        clone_state.score_o = self.score_o
+        clone_state.draws = self.draws
+        clone_state.history = self.history[:]
+        clone_state.zobrist = self.zobrist
+        return clone_state
+
+    def get_legal_moves(self):
+        empty = self.empty
+        if self.next_board is not None and self.board_winners[self.next_board] is None:
+            return list(MOVES[self.next_board][empty[self.next_board]])
+
+        moves = []
+        for b in CELLS[FULL ^ self.closed]:
+            moves.extend(MOVES[b][empty[b]])
+        return moves
+
+    def legal_move_count(self):
+        empty = self.empty
+        if self.next_board is not None and self.board_winners[self.next_board] is None:
+            return POPCOUNT[empty[self.next_board]]
+        return sum(POPCOUNT[empty[b]] for b in CELLS[FULL ^ self.closed])
+
+    def random_move(self):
+        empty = self.empty
+        if self.next_board is not None and self.board_winners[self.next_board] is None:
+            return random.choice(MOVES[self.next_board][empty[self.next_board]])
+
+        open_boards = CELLS[FULL ^ self.closed]
+        r = int(random.random() * sum([POPCOUNT[empty[b]] for b in open_boards]))
+        for b in open_boards:
+            count = POPCOUNT[empty[b]]
+            if r < count:
+                return MOVES[b][empty[b]][r]
+            r -= count
+
+    def make_move(self, move):
+        board_index, cell_index = move
+        player = self.current_player
+        masks = self.masks[player]
+        mask = masks[board_index] | 1 << cell_index
+        masks[board_index] = mask
+        empty = self.empty
+        empty[board_index] ^= 1 << cell_index
+        captured = False
+        overall_winner = self.overall_winner
+
+        if self.board_winners[board_index] is None:
+            if WINS[mask]:
+                self._capture(board_index, player)
+                captured = True
+            elif not empty[board_index]:
+                self._capture(board_index, self.TOKENS[3])
+                captured = True
+
+        self.history.append((move, self.next_board, captured, overall_winner, self.zobrist))
+        next_board = cell_index if self.board_winners[cell_index] is None else None
+        self.zobrist ^= (
+            self.ZOBRIST_CELLS[player][board_index][cell_index]
+            ^ ZOBRIST_SIDE
+            ^ ZOBRIST_NEXT[self.next_board]
+            ^ ZOBRIST_NEXT[next_board]
+        )
+        self.next_board = next_board
+        self.current_player = self.OPPONENT[player]
+
+    def unmake_move(self):
+        move, next_board, captured, overall_winner, zobrist = self.history.pop()
+        board_index, cell_index = move
+        player = self.OPPONENT[self.current_player]
+        self.masks[player][board_index] ^= 1 << cell_index
+        self.empty[board_index] |= 1 << cell_index
+
+        if captured:
+            _, x, o, draw = self.TOKENS
+            winner = self.board_winners[board_index]
+            self.board_winners[board_index] = None
+            self.closed ^= 1 << board_index
+            if winner == x:
+                self.score_x -= 1
+            elif winner == o:
+                self.score_o -= 1
+            else:
+                self.draws -= 1
+            if winner != draw:
+                self.meta[winner] ^= 1 << board_index
+
+        self.overall_winner = overall_winner
+        self.next_board = next_board
+        self.zobrist = zobrist
+        self.current_player = player
+
+    def _close_board(self, board_index):
+        _, x, o, draw = self.TOKENS
+        if WINS[self.masks[x][board_index]]:
+            self._capture(board_index, x)
+        elif WINS[self.masks[o][board_index]]:
+            self._capture(board_index, o)
+        elif not self.empty[board_index]:
+            self._capture(board_index, draw)
+
+    def _capture(self, board_index, winner):
+        _, x, o, draw = self.TOKENS
+        self.board_winners[board_index] = winner
+        self.closed |= 1 << board_index
+        if winner == x:
+            self.score_x += 1
+        elif winner == o:
+            self.score_o += 1
+        else:
+            self.draws += 1
+
+        if winner != draw:
+            self.meta[winner] |= 1 << board_index
+            if WINS[self.meta[winner]] and self.overall_winner is None:
+                self.overall_winner = winner
+                return
+        if self.closed == FULL and self.overall_winner is None:
+            self.overall_winner = draw
+
+    def is_terminal(self):
+        return self.overall_winner is not None
+
+    def key(self):
+        return self.zobrist
+
+    def compute_zobrist(self):
+        _, x, o, _ = self.TOKENS
+        return zobrist_hash(self.masks[x], self.masks[o], self.current_player == o, self.next_board)
@@ -0,0 +1,155 @@
+import os
+import sys
+import mmap
+import struct
+import random
+import argparse
+from multiprocessing import Pool
+from game import search_tree
+from bitboard import BitboardState
+
+MAGIC = b"UTTB"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxI")
+RECORD = struct.Struct("<QBxxxII")
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        if HEADER.size + self.count * RECORD.size > len(self.data):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def record(self, index):
+        return RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+
+    def lookup(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key = self.record(middle)[0]
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                _, move, visits, wins = self.record(middle)
+                return divmod(move, 9), visits, wins
+        return None
+
+    def best_move(self, state):
+        entry = self.lookup(state.key())
+        if entry is None or entry[0] not in state.get_legal_moves():
+            return None
+        return entry[0]
+
+
+def book_positions(plies):
+    positions = {}
+    frontier = [BitboardState()]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for state in frontier:
+            if state.key() in positions or state.is_terminal():
+                continue
+            positions[state.key()] = state
+            if ply < plies:
+                for move in state.get_legal_moves():
+                    child = state.clone()
+                    child.make_move(move)
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return list(positions.values())
+
+
+def analyse_position(job):
+    state, iterations, seed = job
+    random.seed(seed)
+    root = search_tree(state, iterations)
+    move, child = max(root.children.items(), key=lambda item: item[1].visits)
+    return state.key(), move[0] * 9 + move[1], child.visits, child.wins
+
+
+def write_book(path, records):
+    records = sorted(records)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+
+
+def build_book(path, plies, iterations, workers=None, seed=0):
+    positions = book_positions(plies)
+    jobs = [(state, iterations, seed + i) for i, state in enumerate(positions)]
+    records = []
+    with Pool(workers) as pool:
+        for done, record in enumerate(pool.imap_unordered(analyse_position, jobs), 1):
+            records.append(record)
+            print(f"\r{done}/{len(jobs)} positions", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    write_book(path, records)
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="deep-search the first plies and write a book")
+    build.add_argument("out")
+    build.add_argument("--plies", type=int, default=2)
+    build.add_argument("--iterations", type=int, default=20000)
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    build.add_argument("--seed", type=int, default=0)
+
+    probe = commands.add_parser("probe", help="look up the position after a move list")
+    probe.add_argument("book")
+    probe.add_argument("moves", nargs="*", type=int, help="moves as board*9+cell")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        count = build_book(args.out, args.plies, args.iterations, args.workers, args.seed)
+        print(f"wrote {count} positions to {args.out}")
+        return 0
+
+    state = BitboardState()
+    for move in args.moves:
+        state.make_move(divmod(move, 9))
+    with OpeningBook(args.book) as book:
+        entry = book.lookup(state.key())
+    if entry is None:
+        print("position not in book")
+        return 1
+    (board, cell), visits, wins = entry
+    print(f"move {board * 9 + cell} (board {board}, cell {cell}) visits {visits} wins {wins}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
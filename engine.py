@@ -0,0 +1,186 @@
+import sys
+import math
+import threading
+import argparse
+from game import MCTS, SearchStats
+from bitboard import BitboardState
+from book import OpeningBook
+from priors import PatternPriors
+
+
+def format_move(move):
+    return "none" if move is None else str(move[0] * 9 + move[1])
+
+
+def parse_move(text):
+    value = int(text)
+    if not 0 <= value < 81:
+        raise ValueError(f"move {text} is out of range")
+    return divmod(value, 9)
+
+
+class Engine:
+    def __init__(self, output=sys.stdout, info_interval=1000, **options):
+        self.output = output
+        self.info_interval = info_interval
+        self.mcts = MCTS(**options)
+        self.base = "startpos"
+        self.moves = []
+        self.state = BitboardState()
+        self.search_thread = None
+        self.cancel = None
+        self.lock = threading.Lock()
+        self.commands = {
+            "isready": self.on_isready,
+            "newgame": self.on_newgame,
+            "position": self.on_position,
+            "go": self.on_go,
+            "stop": self.on_stop,
+        }
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def send_info(self, stats):
+        self.send(
+            f"info iterations {stats.iterations} nodes {stats.nodes} depth {stats.max_depth}"
+            f" time {stats.elapsed * 1000:.0f} ips {stats.iterations_per_second:.0f}"
+            f" best {format_move(stats.best_move)}"
+        )
+
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return True
+        if words[0] == "quit":
+            self.stop()
+            return False
+        command = self.commands.get(words[0])
+        if command is None:
+            self.send(f"error unknown command {words[0]!r}")
+            return True
+        try:
+            command(words[1:])
+        except ValueError as error:
+            self.send(f"error {error}")
+        return True
+
+    def stop(self):
+        if self.search_thread is not None:
+            self.cancel.set()
+            self.search_thread.join()
+            self.search_thread = None
+            self.cancel = None
+
+    def on_isready(self, args):
+        self.send("readyok")
+
+    def on_newgame(self, args):
+        self.stop()
+        self.mcts.reset()
+        self.base = "startpos"
+        self.moves = []
+        self.state = BitboardState()
+
+    def on_position(self, args):
+        if not args:
+            raise ValueError("position needs startpos or compact <position>")
+        if args[0] == "startpos":
+            base, rest = "startpos", args[1:]
+        elif args[0] == "compact" and len(args) > 1:
+            base, rest = args[1], args[2:]
+        else:
+            raise ValueError("position needs startpos or compact <position>")
+        if rest and rest[0] != "moves":
+            raise ValueError(f"unexpected {rest[0]!r} in position")
+
+        state = BitboardState() if base == "startpos" else BitboardState.from_compact(base)
+        moves = [parse_move(word) for word in rest[1:]]
+        for move in moves:
+            if state.is_terminal() or move not in state.get_legal_moves():
+                raise ValueError(f"illegal move {format_move(move)}")
+            state.make_move(move)
+
+        self.stop()
+        if base == self.base and moves[:len(self.moves)] == self.moves:
+            for move in moves[len(self.moves):]:
+                self.mcts.advance(move)
+        self.base = base
+        self.moves = moves
+        self.state = state
+
+    def on_go(self, args):
+        iterations = None
+        time_limit = None
+        options = iter(args)
+        for option in options:
+            if option == "infinite":
+                continue
+            value = next(options, None)
+            if value is None:
+                raise ValueError(f"go {option} needs a value")
+            if option == "iterations":
+                iterations = int(value)
+            elif option == "movetime":
+                time_limit = int(value) / 1000
+            else:
+                raise ValueError(f"unknown go option {option!r}")
+
+        self.stop()
+        if self.state.is_terminal():
+            self.send(f"bestmove none key {self.state.key()}")
+            return
+        self.cancel = threading.Event()
+        self.search_thread = threading.Thread(
+            target=self.search,
+            args=(self.state.clone(), iterations, time_limit, self.cancel),
+            daemon=True,
+        )
+        self.search_thread.start()
+
+    def on_stop(self, args):
+        self.stop()
+
+    def search(self, state, iterations, time_limit, cancel):
+        stats = SearchStats(self.send_info, self.info_interval)
+        move = self.mcts.search(state, iterations, time_limit, cancel, stats)
+        self.send(f"bestmove {format_move(move)} key {state.key()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless engine speaking a line-based protocol on stdin/stdout")
+    parser.add_argument("--backend", default="python", choices=("python", "numpy"))
+    parser.add_argument("--exploration", type=float, default=math.sqrt(2))
+    parser.add_argument("--table-size", type=int)
+    parser.add_argument("--playout", default="random", choices=("random", "heavy"))
+    parser.add_argument("--rave", type=float, help="RAVE equivalence parameter")
+    parser.add_argument("--solve-below", type=int, default=16, help="empty cells at which the exact solver takes over")
+    parser.add_argument("--book", help="opening book file")
+    parser.add_argument("--priors", help="pattern prior table; switches selection to PUCT")
+    parser.add_argument("--workers", type=int, help="root-parallel search processes")
+    parser.add_argument("--info-interval", type=int, default=1000, help="iterations between info lines")
+    args = parser.parse_args(argv)
+
+    engine = Engine(
+        info_interval=args.info_interval,
+        backend=args.backend,
+        exploration=args.exploration,
+        table_size=args.table_size,
+        playout=args.playout,
+        rave_k=args.rave,
+        solve_below=args.solve_below,
+        book=OpeningBook(args.book) if args.book else None,
+        priors=PatternPriors(args.priors) if args.priors else None,
+        workers=args.workers,
+    )
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,117 +1,111 @@
 import math
+import time
 import random
-import copy
+from solver import empty_cells, solve_move, SolverAborted
+from playout import PLAYOUTS
+from bitboard import BitboardState, token_tables, mask_boards
+
+class UltimateTTTState(BitboardState):
+    TOKENS = (None, "X", "O", "D")
+    OPPONENT, ZOBRIST_CELLS, MARKS = token_tables(TOKENS)
 
-class UltimateTTTState:
     def __init__(self):
-        self.boards = [[" " for _ in range(9)] for _ in range(9)]
-        self.board_winners = [None for _ in range(9)]
-        self.current_player = "X"
-        self.next_board = None
-        self.overall_winner = None
-        self.score_x = 0
-        self.score_o = 0
-        self.draws = 0
+        super().__init__()
+        self.grid = [[" " for _ in range(9)] for _ in range(9)]
+
+    @classmethod
+    def from_compact(cls, text):
+        state = super().from_compact(text)
+        state.grid = mask_boards(state)
+        return state
+
+    @property
+    def boards(self):
+        return self.grid
 
     def clone(self):
-        clone_state = UltimateTTTState()
-        clone_state.boards = copy.deepcopy(self.boards)
-        clone_state.board_winners = copy.deepcopy(self.board_winners)
-        clone_state.current_player = self.current_player
-        clone_state.next_board = self.next_board
-        clone_state.overall_winner = self.overall_winner
-        clone_state.score_x = self.score_x
-        clone_state.score_o = self.score_o
-        clone_state.draws = self.draws
+        clone_state = super().clone()
+        clone_state.grid = [board[:] for board in self.grid]
         return clone_state
 
-    def get_legal_moves(self):
-        moves = []
-        if self.next_board is not None and self.board_winners[self.next_board] is None:
-            boards_to_consider = [self.next_board]
-        else:
-            boards_to_consider = [i for i in range(9) if self.board_winners[i] is None]
-        
-        for b in boards_to_consider:
-            for i in range(9):
-                if self.boards[b][i] == " ":
-                    moves.append((b, i))
-        return moves
-
     def make_move(self, move):
-        board_index, cell_index = move
-        self.boards[board_index][cell_index] = self.current_player
-
-        if self.board_winners[board_index] is None:
-            winner = self.check_small_board_winner(self.boards[board_index])
-            if winner is not None:
-                self.board_winners[board_index] = winner
-                if winner == "X":
-                    self.score_x += 1
-                elif winner == "O":
-                    self.score_o += 1
-                elif winner == "D":
-                    self.draws += 1
-            elif " " not in self.boards[board_index]:
-                self.board_winners[board_index] = "D"
-                self.draws += 1
-
-        overall = self.check_overall_winner()
-        if overall:
-            self.overall_winner = overall
-
-        self.next_board = cell_index if self.board_winners[cell_index] is None else None
-        self.current_player = "O" if self.current_player == "X" else "X"
-
-    def check_small_board_winner(self, board):
-        wins = [
-            (0, 1, 2), (3, 4, 5), (6, 7, 8),
-            (0, 3, 6), (1, 4, 7), (2, 5, 8),
-            (0, 4, 8), (2, 4, 6)
-        ]
-        for a, b, c in wins:
-            if board[a] != " " and board[a] == board[b] == board[c]:
-                return board[a]
-        return None
-
-    def check_overall_winner(self):
-        meta = [bw if bw in ["X", "O"] else " " for bw in self.board_winners]
-        wins = [
-            (0, 1, 2), (3, 4, 5), (6, 7, 8),
-            (0, 3, 6), (1, 4, 7), (2, 5, 8),
-            (0, 4, 8), (2, 4, 6)
-        ]
-        for a, b, c in wins:
-            if meta[a] != " " and meta[a] == meta[b] == meta[c]:
-                return meta[a]
-        if all(bw is not None for bw in self.board_winners):
-            return "D"
-        return None
-
-    def is_terminal(self):
-        return self.overall_winner is not None or len(self.get_legal_moves()) == 0
+        self.grid[move[0]][move[1]] = self.current_player
+        super().make_move(move)
+
+    def unmake_move(self):
+        board_index, cell_index = self.history[-1][0]
+        self.grid[board_index][cell_index] = " "
+        super().unmake_move()
 
 class MCTSNode:
-    def __init__(self, state, parent=None, move=None):
-        self.state = state
-        self.parent = parent
-        self.move = move
-        self.children = []
-        self.untried_moves = state.get_legal_moves()
+    def __init__(self, state, priors=None):
+        self.key = state.key()
+        self.children = {}
         self.visits = 0
         self.wins = 0
-        self.player_just_moved = "O" if state.current_player == "X" else "X"
-
-    def uct_select_child(self, exploration=math.sqrt(2)):
-        return max(
-            self.children,
-            key=lambda c: (c.wins / c.visits) + exploration * math.sqrt(math.log(self.visits) / c.visits)
-        )
-
-    def add_child(self, move, state):
-        child = MCTSNode(state, parent=self, move=move)
-        self.untried_moves.remove(move)
-        self.children.append(child)
+        self.rave_visits = 0
+        self.rave_wins = 0
+        self.player_just_moved = state.player_just_moved
+        self.proven = None
+        self.priors = None
+        if state.is_terminal():
+            self.untried_moves = []
+            self.proven = 1 if state.overall_winner == state.player_just_moved else 0
+        else:
+            self.untried_moves = state.get_legal_moves()
+            random.shuffle(self.untried_moves)
+            if priors is not None:
+                self.priors = priors.move_priors(state, self.untried_moves)
+                self.untried_moves.sort(key=self.priors.get)
+
+    def uct_select_child(self, exploration=math.sqrt(2), rave_k=None):
+        log_visits = math.log(self.visits)
+        best = None
+        best_score = -math.inf
+        for item in self.children.items():
+            child = item[1]
+            if child.proven is None or child.proven == 0:
+                score = child.wins / child.visits
+                if rave_k is not None and child.rave_visits:
+                    beta = math.sqrt(rave_k / (3 * child.visits + rave_k))
+                    score += beta * (child.rave_wins / child.rave_visits - score)
+                score += exploration * math.sqrt(log_visits / child.visits)
+            else:
+                score = child.proven * math.inf
+            if best is None or score > best_score:
+                best = item
+                best_score = score
+        return best
+
+    def puct_select_child(self, exploration=math.sqrt(2), rave_k=None):
+        priors = self.priors
+        scale = exploration * math.sqrt(self.visits)
+        best = None
+        best_score = -math.inf
+        if self.untried_moves:
+            best_score = 1 - self.wins / self.visits + scale * priors[self.untried_moves[-1]]
+        for item in self.children.items():
+            child = item[1]
+            if child.proven is None or child.proven == 0:
+                score = child.wins / child.visits
+                if rave_k is not None and child.rave_visits:
+                    beta = math.sqrt(rave_k / (3 * child.visits + rave_k))
+                    score += beta * (child.rave_wins / child.rave_visits - score)
+                score += scale * priors[item[0]] / (1 + child.visits)
+            else:
+                score = child.proven * math.inf
+            if score > best_score:
+                best = item
+                best_score = score
+        return best
+
+    def add_child(self, move, state, table=None, priors=None):
+        child = None if table is None else table.get(state.key())
+        if child is None:
+            child = MCTSNode(state, priors)
+            if table is not None:
+                table.put(child)
+        self.children[move] = child
         return child
 
     def update(self, result):
@@ -119,28 +113,363 @@ class MCTSNode:
         if result == self.player_just_moved:
             self.wins += 1
 
-def mcts(root_state, iterations):
-    root_node = MCTSNode(root_state)
-    
-    for _ in range(iterations):
-        node = root_node
-        state = root_state.clone()
-
-        while not node.untried_moves and node.children:
-            node = node.uct_select_child()
-            state.make_move(node.move)
-
-        if node.untried_moves:
-            move = random.choice(node.untried_moves)
-            state.make_move(move)
-            node = node.add_child(move, state)
-
-        while not state.is_terminal():
-            state.make_move(random.choice(state.get_legal_moves()))
-
-        result = state.overall_winner
-        while node is not None:
-            node.update(result)
-            node = node.parent
-    
-    return max(root_node.children, key=lambda c: c.visits).move
\ No newline at end of file
+    def solve(self):
+        children = self.children.values()
+        if any(child.proven == 1 for child in children):
+            self.proven = -1
+        elif not self.untried_moves and all(child.proven is not None for child in children):
+            self.proven = -max(child.proven for child in children)
+        return self.proven is not None
+
+def proven_result(state, proven):
+    return (state.TOKENS[3], state.player_just_moved, state.current_player)[proven]
+
+def propagate_proof(path):
+    for node in reversed(path[:-1]):
+        if node.proven is not None or not node.solve():
+            break
+
+def update_amaf(path, moves, result):
+    for depth, node in enumerate(path):
+        children = node.children
+        if not children:
+            continue
+        for move in moves[depth::2]:
+            child = children.get(move)
+            if child is not None:
+                child.rave_visits += 1
+                if result == child.player_just_moved:
+                    child.rave_wins += 1
+
+class TranspositionTable:
+    def __init__(self, max_size=1_000_000):
+        self.max_size = max_size
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, key):
+        return self.nodes.get(key)
+
+    def put(self, node):
+        if len(self.nodes) < self.max_size:
+            self.nodes[node.key] = node
+
+    def rebuild(self, root):
+        self.nodes = {root.key: root}
+        stack = [root]
+        while stack and len(self.nodes) < self.max_size:
+            for child in stack.pop().children.values():
+                if child.key not in self.nodes:
+                    self.nodes[child.key] = child
+                    stack.append(child)
+
+class SearchStats:
+    def __init__(self, callback=None, interval=1000):
+        self.callback = callback
+        self.interval = interval
+        self.next_report = interval
+        self.last_report = None
+        self.start_time = None
+        self.iterations = 0
+        self.nodes = 0
+        self.max_depth = 0
+        self.selection_time = 0.0
+        self.expansion_time = 0.0
+        self.simulation_time = 0.0
+        self.backpropagation_time = 0.0
+        self.root_visits = {}
+        self.best_move = None
+
+    @property
+    def elapsed(self):
+        return 0.0 if self.start_time is None else time.perf_counter() - self.start_time
+
+    @property
+    def iterations_per_second(self):
+        elapsed = self.elapsed
+        return self.iterations / elapsed if elapsed else 0.0
+
+    @property
+    def nodes_per_second(self):
+        elapsed = self.elapsed
+        return self.nodes / elapsed if elapsed else 0.0
+
+    def begin(self):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+    def add(self, root, iterations, nodes, depth, selection, expansion, simulation, backpropagation):
+        self.iterations += iterations
+        self.nodes += nodes
+        self.max_depth = max(self.max_depth, depth)
+        self.selection_time += selection
+        self.expansion_time += expansion
+        self.simulation_time += simulation
+        self.backpropagation_time += backpropagation
+        if self.iterations >= self.next_report:
+            self.report(root)
+
+    def report(self, root):
+        self.root_visits = {move: child.visits for move, child in root.children.items()}
+        self.best_move = max(self.root_visits, key=self.root_visits.get) if self.root_visits else None
+        self.next_report = self.iterations + self.interval
+        self.last_report = self.iterations
+        if self.callback is not None:
+            self.callback(self)
+
+    def as_dict(self):
+        return {
+            "iterations": self.iterations,
+            "nodes": self.nodes,
+            "elapsed": self.elapsed,
+            "iterations_per_second": self.iterations_per_second,
+            "nodes_per_second": self.nodes_per_second,
+            "max_depth": self.max_depth,
+            "best_move": self.best_move,
+            "root_visits": self.root_visits,
+            "selection_time": self.selection_time,
+            "expansion_time": self.expansion_time,
+            "simulation_time": self.simulation_time,
+            "backpropagation_time": self.backpropagation_time,
+        }
+
+def select_path(node, state, exploration=math.sqrt(2), rave_k=None):
+    path = [node]
+    while node.proven is None and node.children:
+        if node.priors is not None:
+            item = node.puct_select_child(exploration, rave_k)
+            if item is None:
+                break
+        elif node.untried_moves:
+            break
+        else:
+            item = node.uct_select_child(exploration, rave_k)
+        move, node = item
+        state.make_move(move)
+        path.append(node)
+    return path
+
+def expand_path(path, state, table=None, priors=None):
+    node = path[-1]
+    if node.untried_moves and node.proven is None:
+        move = node.untried_moves.pop()
+        state.make_move(move)
+        path.append(node.add_child(move, state, table, priors))
+    return path
+
+class MCTS:
+    def __init__(self, backend="python", batch_size=256, table_size=None, exploration=math.sqrt(2), book=None, solve_below=16, playout="random", rave_k=None, priors=None, workers=None):
+        if playout not in PLAYOUTS:
+            raise ValueError(f"unknown playout policy {playout!r}")
+        if backend == "numpy" and playout != "random":
+            raise ValueError("the numpy backend only runs random playouts")
+        if backend == "numpy" and rave_k is not None:
+            raise ValueError("the numpy backend does not record AMAF statistics")
+        self.backend = backend
+        self.playout_move = PLAYOUTS[playout]
+        self.book = book
+        self.solve_below = solve_below
+        self.solver_table = {}
+        self.exploration = exploration
+        self.rave_k = rave_k
+        self.priors = priors
+        self.batch_size = batch_size
+        self.table = None if table_size is None else TranspositionTable(table_size)
+        self.workers = workers
+        self.worker_options = {
+            "backend": backend,
+            "batch_size": batch_size,
+            "table_size": table_size,
+            "exploration": exploration,
+            "playout": playout,
+            "rave_k": rave_k,
+            "priors": priors,
+        }
+        self.root = None
+        self.state = None
+
+    def reset(self):
+        self.root = None
+        self.state = None
+        self.solver_table = {}
+        if self.table is not None:
+            self.table = TranspositionTable(self.table.max_size)
+
+    def advance(self, move):
+        if self.root is None:
+            return
+        self.state.make_move(move)
+        self.root = self.root.children.get(move) or MCTSNode(self.state, self.priors)
+        if self.table is not None:
+            self.table.rebuild(self.root)
+
+    def run(self, state, iterations=None, time_limit=None, cancel=None, stats=None):
+        if iterations is None and time_limit is None and cancel is None:
+            raise ValueError("search needs an iteration count, a time limit or a cancel token")
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+        if self.root is None or self.state.key() != state.key():
+            self.state = state.clone()
+            self.root = MCTSNode(self.state, self.priors)
+            if self.table is not None:
+                self.table.rebuild(self.root)
+
+        if stats is not None:
+            stats.begin()
+        if self.backend == "numpy":
+            self.run_batches(self.root, self.state, iterations, deadline, cancel, stats)
+        else:
+            self.run_playouts(self.root, self.state, iterations, deadline, cancel, stats)
+        if stats is not None and stats.last_report != stats.iterations:
+            stats.report(self.root)
+        return self.root
+
+    def run_playouts(self, root_node, state, iterations, deadline, cancel, stats=None):
+        playout_move = self.playout_move
+        root_depth = len(state.history)
+        done = 0
+        while (iterations is None or done < iterations) and root_node.proven is None:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if cancel is not None and cancel.is_set():
+                break
+
+            if stats is not None:
+                selection_start = time.perf_counter()
+            path = select_path(root_node, state, self.exploration, self.rave_k)
+            if stats is not None:
+                selected = len(path)
+                expansion_start = time.perf_counter()
+            expand_path(path, state, self.table, self.priors)
+            if stats is not None:
+                simulation_start = time.perf_counter()
+
+            if path[-1].proven is None:
+                while not state.is_terminal():
+                    state.make_move(playout_move(state))
+                result = state.overall_winner
+            else:
+                result = proven_result(state, path[-1].proven)
+
+            if stats is not None:
+                backpropagation_start = time.perf_counter()
+            for node in path:
+                node.update(result)
+            propagate_proof(path)
+            if self.rave_k is not None:
+                update_amaf(path, [record[0] for record in state.history[root_depth:]], result)
+
+            while len(state.history) > root_depth:
+                state.unmake_move()
+            done += 1
+
+            if stats is not None:
+                stats.add(
+                    root_node, 1, len(path) - selected, len(path) - 1,
+                    expansion_start - selection_start,
+                    simulation_start - expansion_start,
+                    backpropagation_start - simulation_start,
+                    time.perf_counter() - backpropagation_start,
+                )
+        return done
+
+    def run_batches(self, root_node, state, iterations, deadline, cancel, stats=None):
+        import numpy as np
+        from vectorized import playout
+
+        rng = np.random.default_rng(random.getrandbits(64))
+        root_depth = len(state.history)
+        done = 0
+        while (iterations is None or done < iterations) and root_node.proven is None:
+            leaves = []
+            positions = []
+            proven = []
+            selection = expansion = 0.0
+            nodes = depth = 0
+            batch_size = self.batch_size if iterations is None else min(self.batch_size, iterations - done)
+            for _ in range(batch_size):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if cancel is not None and cancel.is_set():
+                    break
+                if stats is not None:
+                    selection_start = time.perf_counter()
+                path = select_path(root_node, state, self.exploration, self.rave_k)
+                if stats is not None:
+                    selected = len(path)
+                    expansion_start = time.perf_counter()
+                expand_path(path, state, self.table, self.priors)
+                if stats is not None:
+                    selection += expansion_start - selection_start
+                    expansion += time.perf_counter() - expansion_start
+                    nodes += len(path) - selected
+                    depth = max(depth, len(path) - 1)
+                leaves.append(path)
+                if path[-1].proven is None:
+                    positions.append(state.clone())
+                    proven.append(None)
+                else:
+                    proven.append(proven_result(state, path[-1].proven))
+                for node in path:
+                    node.visits += 1
+                while len(state.history) > root_depth:
+                    state.unmake_move()
+            if not leaves:
+                break
+
+            if stats is not None:
+                simulation_start = time.perf_counter()
+            results = iter(playout(positions, rng) if positions else ())
+            if stats is not None:
+                backpropagation_start = time.perf_counter()
+            for path, result in zip(leaves, proven):
+                if result is None:
+                    result = next(results)
+                for node in path:
+                    if result == node.player_just_moved:
+                        node.wins += 1
+                propagate_proof(path)
+            done += len(leaves)
+
+            if stats is not None:
+                stats.add(
+                    root_node, len(leaves), nodes, depth, selection, expansion,
+                    backpropagation_start - simulation_start,
+                    time.perf_counter() - backpropagation_start,
+                )
+        return done
+
+    def best_move(self):
+        if not self.root.children:
+            return self.root.untried_moves[-1] if self.root.untried_moves else None
+        return max(self.root.children.items(), key=lambda item: (item[1].proven or 0, item[1].visits))[0]
+
+    def search(self, state, iterations=None, time_limit=None, cancel=None, stats=None):
+        if self.book is not None:
+            move = self.book.best_move(state)
+            if move is not None:
+                return move
+        if self.solve_below is not None and not state.is_terminal() and empty_cells(state) <= self.solve_below:
+            start = time.perf_counter()
+            deadline = None if time_limit is None else start + time_limit / 2
+            try:
+                return solve_move(state.clone(), self.solver_table, deadline, cancel)[0]
+            except SolverAborted:
+                if time_limit is not None:
+                    time_limit = max(start + time_limit - time.perf_counter(), 0.0)
+        if self.workers is not None and self.workers > 1 and (iterations is not None or time_limit is not None):
+            from parallel import parallel_mcts
+
+            move = parallel_mcts(state, iterations, self.workers, time_limit, cancel, **self.worker_options)
+            if move is not None:
+                return move
+        self.run(state, iterations, time_limit, cancel, stats)
+        return self.best_move()
+
+def search_tree(root_state, iterations=None, time_limit=None, cancel=None, stats=None, **options):
+    return MCTS(**options).run(root_state, iterations, time_limit, cancel, stats)
+
+def mcts(root_state, iterations=None, time_limit=None, cancel=None, stats=None, **options):
+    return MCTS(**options).search(root_state, iterations, time_limit, cancel, stats)
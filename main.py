@@ -2,8 +2,9 @@ import os
 import sys
 import random
 import pygame
-import threading
-from game import UltimateTTTState, mcts
+from game import UltimateTTTState
+from remote import EngineProcess
+from render import render_text, render_outlined_text, filled_surface, DirtyRegions
 
 pygame.init()
 SCREEN_WIDTH, SCREEN_HEIGHT = 800, 700
@@ -79,7 +80,16 @@ pvp_score_x = 0
 pvp_score_o = 0
 pvp_draws = 0
 
-ai_info = {"thread": None, "result": None}
+ai_info = {"job": None, "ponder": None}
+engine_args = []
+for option, name in (("--book", "assets/book.bin"), ("--priors", "assets/priors.bin")):
+    path = os.path.join(base_dir, name)
+    if os.path.exists(path):
+        engine_args += [option, path]
+if (os.cpu_count() or 1) > 1:
+    engine_args += ["--workers", str(os.cpu_count())]
+engine = EngineProcess(*engine_args)
+PONDER_LIMIT = 10
 thinking_counter = 0
 
 
@@ -104,7 +114,7 @@ class Slider:
         )
         knob_radius = 10
         pygame.draw.circle(surf, colours["black"], (knob_x, self.rect.centery), knob_radius)
-        value_text = text_font.render(str(self.value), True, colours["black"])
+        value_text = render_text(text_font, str(self.value), colours["black"])
         surf.blit(
             value_text,
             (self.rect.centerx - value_text.get_width() // 2, self.rect.y - 25),
@@ -148,7 +158,7 @@ class Button:
         color = self.hover_color if self.rect.collidepoint(mouse_pos) else self.bg_color
         pygame.draw.rect(surf, color, self.rect, border_radius=self.corner_radius)
         pygame.draw.rect(surf, colours["black"], self.rect, 2, border_radius=self.corner_radius)
-        text_surf = self.font.render(self.original_text, True, self.text_color)
+        text_surf = render_text(self.font, self.original_text, self.text_color)
         text_rect = text_surf.get_rect(center=self.rect.center)
         surf.blit(text_surf, text_rect)
 
@@ -157,6 +167,9 @@ class Button:
             if self.rect.collidepoint(event.pos):
                 self.callback()
 
+    def hovered(self, mouse_pos):
+        return self.rect.collidepoint(mouse_pos)
+
 
 def preset_easy():
     global mcts_iterations
@@ -188,17 +201,29 @@ preset_hard_button = Button(
 )
 
 
+def cancel_searches():
+    engine.new_game()
+    ai_info["job"] = None
+    ai_info["ponder"] = None
+
+
+def ai_thinking():
+    return (game_mode in ("1p", "cpu")
+            and ai_info["job"] is not None
+            and not ai_info["job"].done)
+
+
 def on_reset():
     global game_state
     game_state = UltimateTTTState()
+    cancel_searches()
 
 
 def on_return():
     global scene, game_state, ai_info
     scene = "menu"
     game_state = None
-    ai_info["thread"] = None
-    ai_info["result"] = None
+    cancel_searches()
 
 
 reset_button = Button((SCREEN_WIDTH - 230, 20, 100, 60), "Reset", text_font, on_reset)
@@ -258,6 +283,7 @@ class FallingMarker:
             marker_images["small"][self.marker], (30, 30)
         )
         self.alpha = random.randint(50, 150)
+        self.img.set_alpha(self.alpha)
 
     def update(self):
         self.y += self.speed
@@ -266,9 +292,7 @@ class FallingMarker:
             self.x = random.randint(0, SCREEN_WIDTH)
 
     def draw(self, surf):
-        temp_img = self.img.copy()
-        temp_img.set_alpha(self.alpha)
-        surf.blit(temp_img, (self.x, self.y))
+        surf.blit(self.img, (self.x, self.y))
 
 
 falling_markers = [FallingMarker() for _ in range(30)]
@@ -276,26 +300,20 @@ falling_markers = [FallingMarker() for _ in range(30)]
 
 def draw_text_with_outline(surf, text, font, pos, color, outline_color, outline_width=2):
     x, y = pos
-    for dx in range(-outline_width, outline_width + 1):
-        for dy in range(-outline_width, outline_width + 1):
-            if dx == 0 and dy == 0:
-                continue
-            outline_surf = font.render(text, True, outline_color)
-            surf.blit(outline_surf, (x + dx, y + dy))
-    text_surf = font.render(text, True, color)
-    surf.blit(text_surf, pos)
+    outlined = render_outlined_text(font, text, color, outline_color, outline_width)
+    surf.blit(outlined, (x - outline_width, y - outline_width))
 
 
 def draw_controls():
     if game_mode == "2p":
         global pvp_score_x, pvp_score_o, pvp_draws
         y_offset = 100
-        title = text_font.render("Scoreboard", True, colours["black"])
+        title = render_text(text_font, "Scoreboard", colours["black"])
         screen.blit(title, (20, y_offset))
         y_offset += 40
 
         o_img = marker_images["small"]["O"]
-        o_text = text_font.render(str(pvp_score_o), True, colours["black"])
+        o_text = render_text(text_font, str(pvp_score_o), colours["black"])
         screen.blit(o_img, (20, y_offset))
         screen.blit(
             o_text,
@@ -307,7 +325,7 @@ def draw_controls():
         y_offset += max(o_img.get_height(), o_text.get_height()) + 20
 
         x_img = marker_images["small"]["X"]
-        x_text = text_font.render(str(pvp_score_x), True, colours["black"])
+        x_text = render_text(text_font, str(pvp_score_x), colours["black"])
         screen.blit(x_img, (20, y_offset))
         screen.blit(
             x_text,
@@ -319,7 +337,7 @@ def draw_controls():
         y_offset += max(x_img.get_height(), x_text.get_height()) + 20
 
         d_img = marker_images["small"]["D"]
-        d_text = text_font.render(str(pvp_draws), True, colours["black"])
+        d_text = render_text(text_font, str(pvp_draws), colours["black"])
         screen.blit(d_img, (20, y_offset))
         screen.blit(
             d_text,
@@ -329,7 +347,7 @@ def draw_controls():
             ),
         )
     else:
-        label = text_font.render("MCTS Iterations", True, colours["black"])
+        label = render_text(text_font, "MCTS Iterations", colours["black"])
         screen.blit(label, (slider.rect.x - 35, slider.rect.y - 50))
         slider.draw(screen)
         preset_easy_button.draw(screen)
@@ -339,17 +357,15 @@ def draw_controls():
 
 def draw_turn_indicator():
     base_text = "It's the turn of:"
-    base_surf = text_font.render(base_text, True, colours["black"])
+    base_surf = render_text(text_font, base_text, colours["black"])
     screen.blit(base_surf, (LEFT_OFFSET, TOP_OFFSET - 40))
     curr_img = marker_images["small"][game_state.current_player]
     screen.blit(curr_img, (LEFT_OFFSET + base_surf.get_width() + 10, TOP_OFFSET - 50))
 
-    if (game_mode in ("1p", "cpu")
-            and ai_info["thread"] is not None
-            and ai_info["thread"].is_alive()):
+    if ai_thinking():
         dots = (thinking_counter // 20) % 4
         think_text = "Thinking" + "." * dots
-        think_surf = text_font.render(think_text, True, colours["black"])
+        think_surf = render_text(text_font, think_text, colours["black"])
         screen.blit(think_surf, (LEFT_OFFSET, TOP_OFFSET - 70))
 
 
@@ -373,54 +389,62 @@ def draw_captured_overlays():
             sub_col = board_index % 3
             x0 = LEFT_OFFSET + sub_col * 3 * CELL_SIZE
             y0 = TOP_OFFSET + sub_row * 3 * CELL_SIZE
-            overlay = pygame.Surface((3 * CELL_SIZE, 3 * CELL_SIZE), pygame.SRCALPHA)
-            overlay.fill(colours["translucent"])
+            overlay = filled_surface((3 * CELL_SIZE, 3 * CELL_SIZE), colours["translucent"])
             screen.blit(overlay, (x0, y0))
 
 
-def draw_ultimate_grid():
+def build_grid_layer():
+    layer = pygame.Surface((BOARD_SIZE, BOARD_SIZE), pygame.SRCALPHA)
     for i in range(1, 9):
-        y = TOP_OFFSET + i * CELL_SIZE
+        y = i * CELL_SIZE
         if i % 3 == 0:
             pygame.draw.line(
-                screen,
+                layer,
                 colours["line"],
-                (LEFT_OFFSET, y),
-                (LEFT_OFFSET + BOARD_SIZE, y),
+                (0, y),
+                (BOARD_SIZE, y),
                 SUBBOARD_LINE_WIDTH,
             )
         else:
             for j in range(3):
-                seg_start_x = LEFT_OFFSET + j * 3 * CELL_SIZE + 6
-                seg_end_x = LEFT_OFFSET + j * 3 * CELL_SIZE + 3 * CELL_SIZE - 6
+                seg_start_x = j * 3 * CELL_SIZE + 6
+                seg_end_x = j * 3 * CELL_SIZE + 3 * CELL_SIZE - 6
                 pygame.draw.line(
-                    screen,
+                    layer,
                     colours["line"],
                     (seg_start_x, y),
                     (seg_end_x, y),
                     INNER_LINE_WIDTH,
                 )
     for i in range(1, 9):
-        x = LEFT_OFFSET + i * CELL_SIZE
+        x = i * CELL_SIZE
         if i % 3 == 0:
             pygame.draw.line(
-                screen,
+                layer,
                 colours["line"],
-                (x, TOP_OFFSET),
-                (x, TOP_OFFSET + BOARD_SIZE),
+                (x, 0),
+                (x, BOARD_SIZE),
                 SUBBOARD_LINE_WIDTH,
             )
         else:
             for j in range(3):
-                seg_start_y = TOP_OFFSET + j * 3 * CELL_SIZE + 6
-                seg_end_y = TOP_OFFSET + j * 3 * CELL_SIZE + 3 * CELL_SIZE - 6
+                seg_start_y = j * 3 * CELL_SIZE + 6
+                seg_end_y = j * 3 * CELL_SIZE + 3 * CELL_SIZE - 6
                 pygame.draw.line(
-                    screen,
+                    layer,
                     colours["line"],
                     (x, seg_start_y),
                     (x, seg_end_y),
                     INNER_LINE_WIDTH,
                 )
+    return layer
+
+
+grid_layer = build_grid_layer()
+
+
+def draw_ultimate_grid():
+    screen.blit(grid_layer, (LEFT_OFFSET, TOP_OFFSET))
 
 
 def draw_big_marks():
@@ -460,7 +484,7 @@ def draw_winner_text():
         if game_state.overall_winner == "D":
             win_text = "Draw!"
             color = colours["black"]
-            surf = winner_font.render(win_text, True, color)
+            surf = render_text(winner_font, win_text, color)
             pos = surf.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
             draw_text_with_outline(
                 screen, win_text, winner_font, (pos.x, pos.y), color, colours["black"]
@@ -469,8 +493,8 @@ def draw_winner_text():
             win_color = colours["x"] if game_state.overall_winner == "X" else colours["o"]
             text1 = "Player"
             text2 = "wins!"
-            text1_surf = winner_font.render(text1, True, win_color)
-            text2_surf = winner_font.render(text2, True, win_color)
+            text1_surf = render_text(winner_font, text1, win_color)
+            text2_surf = render_text(winner_font, text2, win_color)
             marker_img = marker_images["big"][game_state.overall_winner]
             spacing = 20
             total_width = (
@@ -539,8 +563,7 @@ def draw_game_scene():
     draw_legal_border()
 
     if game_state.overall_winner is not None:
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((255, 255, 255, 200))
+        overlay = filled_surface((SCREEN_WIDTH, SCREEN_HEIGHT), (255, 255, 255, 200))
         screen.blit(overlay, (0, 0))
         draw_winner_text()
 
@@ -548,19 +571,57 @@ def draw_game_scene():
     return_button.draw(screen)
 
 
-def run_mcts_in_thread(state, iterations, ai_info_dict):
-    ai_info_dict["result"] = mcts(state, iterations=iterations)
+game_regions = DirtyRegions({
+    "panel": pygame.Rect(0, 0, LEFT_OFFSET, SCREEN_HEIGHT),
+    "header": pygame.Rect(LEFT_OFFSET, 0, SCREEN_WIDTH - LEFT_OFFSET, TOP_OFFSET),
+    "board": pygame.Rect(LEFT_OFFSET, TOP_OFFSET, SCREEN_WIDTH - LEFT_OFFSET, SCREEN_HEIGHT - TOP_OFFSET),
+})
+select_regions = DirtyRegions({"screen": screen.get_rect()})
+
+
+def game_signatures():
+    mouse_pos = pygame.mouse.get_pos()
+    winner = game_state.overall_winner
+    thinking = (thinking_counter // 20) % 4 if ai_thinking() else None
+    presets = (preset_easy_button, preset_medium_button, preset_hard_button)
+    return {
+        "panel": (
+            game_mode, winner, pvp_score_x, pvp_score_o, pvp_draws, slider.value,
+            tuple(button.hovered(mouse_pos) for button in presets),
+        ),
+        "header": (
+            winner, game_state.current_player, thinking,
+            reset_button.hovered(mouse_pos), return_button.hovered(mouse_pos),
+        ),
+        "board": (winner, game_state.key()),
+    }
+
+
+def draw_player_select():
+    screen.fill(colours["background"])
+    prompt = render_text(bold_font, "Select Your Marker", colours["black"])
+    prompt_rect = prompt.get_rect(center=(SCREEN_WIDTH // 2, 150))
+    screen.blit(prompt, prompt_rect)
+
+    for button in player_select_buttons:
+        button.draw(screen)
 
 
 falling_markers = [FallingMarker() for _ in range(30)]
 updated = False
+drawn_scene = None
 
 while True:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            engine.close()
             pygame.quit()
             sys.exit()
 
+        if event.type == pygame.WINDOWEXPOSED:
+            game_regions.invalidate()
+            select_regions.invalidate()
+
         if scene == "menu":
             for button in menu_buttons:
                 button.handle_event(event)
@@ -592,6 +653,9 @@ while True:
                         if not(game_state.next_board is not None and b_index != game_state.next_board):
                             if game_state.boards[b_index][c_index] == " ":
                                 game_state.make_move((b_index, c_index))
+                                if ai_info["ponder"] is not None:
+                                    ai_info["ponder"].cancel()
+                                    ai_info["ponder"] = None
 
             elif game_mode == "2p" and game_state.overall_winner is not None and not updated:
                 updated = True
@@ -614,6 +678,11 @@ while True:
     if scene == "game" and game_mode in ("1p", "cpu") and (game_state is None or game_state.overall_winner is None):
         slider.update()
 
+    if scene != drawn_scene:
+        game_regions.invalidate()
+        select_regions.invalidate()
+        drawn_scene = scene
+
     if scene == "menu":
         pvp_draws = 0
         pvp_score_x = 0
@@ -625,21 +694,18 @@ while True:
             fm.update()
             fm.draw(screen)
 
-        title = bold_font.render("Ultimate Tic Tac Toe", True, colours["black"])
+        title = render_text(bold_font, "Ultimate Tic Tac Toe", colours["black"])
         title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, 100))
         screen.blit(title, title_rect)
 
         for button in menu_buttons:
             button.draw(screen)
+        pygame.display.flip()
 
     elif scene == "player_select":
-        screen.fill(colours["background"])
-        prompt = bold_font.render("Select Your Marker", True, colours["black"])
-        prompt_rect = prompt.get_rect(center=(SCREEN_WIDTH // 2, 150))
-        screen.blit(prompt, prompt_rect)
-
-        for button in player_select_buttons:
-            button.draw(screen)
+        mouse_pos = pygame.mouse.get_pos()
+        signature = tuple(button.hovered(mouse_pos) for button in player_select_buttons)
+        select_regions.redraw(screen, {"screen": signature}, draw_player_select)
 
     elif scene == "game":
         if game_state is None:
@@ -654,22 +720,21 @@ while True:
             elif game_mode == "1p" and game_state.current_player != human_player:
                 need_ai_move = True
 
+            if not need_ai_move and game_mode == "1p" and ai_info["ponder"] is None:
+                ai_info["ponder"] = engine.search(game_state, PONDER_LIMIT * mcts_iterations)
+
             if need_ai_move:
-                if ai_info["thread"] is None:
-                    ai_info["result"] = None
-                    ai_info["thread"] = threading.Thread(
-                        target=run_mcts_in_thread,
-                        args=(game_state, mcts_iterations, ai_info),
-                    )
-                    ai_info["thread"].start()
-
-                elif not ai_info["thread"].is_alive():
-                    if ai_info["result"] is not None:
-                        game_state.make_move(ai_info["result"])
-                        ai_info["result"] = None
-                    ai_info["thread"] = None
+                if ai_info["job"] is None:
+                    ai_info["job"] = engine.search(game_state, mcts_iterations)
+
+                elif ai_info["job"].done:
+                    move = ai_info["job"].result
+                    if (move is not None
+                            and ai_info["job"].position_id == game_state.key()
+                            and move in game_state.get_legal_moves()):
+                        game_state.make_move(move)
+                    ai_info["job"] = None
         thinking_counter += 1
-        draw_game_scene()
+        game_regions.redraw(screen, game_signatures(), draw_game_scene)
 
-    pygame.display.flip()
     clock.tick(60)
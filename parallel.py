@@ -0,0 +1,68 @@
+import os
+import atexit
+import random
+from multiprocessing import get_context
+from game import search_tree
+
+pools = {}
+
+
+def get_pool(workers):
+    pool = pools.get(workers)
+    if pool is None:
+        pool = get_context("spawn").Pool(workers)
+        pools[workers] = pool
+    return pool
+
+
+def discard_pool(workers):
+    pool = pools.pop(workers, None)
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+
+def shutdown_pools():
+    for pool in pools.values():
+        pool.terminate()
+        pool.join()
+    pools.clear()
+
+
+atexit.register(shutdown_pools)
+
+
+def search_root(job):
+    state, iterations, time_limit, seed, options = job
+    random.seed(seed)
+    root_node = search_tree(state, iterations, time_limit=time_limit, **options)
+    return [(move, child.visits, child.wins) for move, child in root_node.children.items()]
+
+
+def merge_root_stats(results):
+    stats = {}
+    for children in results:
+        for move, visits, wins in children:
+            total_visits, total_wins = stats.get(move, (0, 0))
+            stats[move] = (total_visits + visits, total_wins + wins)
+    return stats
+
+
+def parallel_root_stats(root_state, iterations=None, workers=None, time_limit=None, cancel=None, **options):
+    workers = workers or os.cpu_count() or 1
+    base_seed = random.getrandbits(32)
+    jobs = [(root_state, iterations, time_limit, base_seed + i, options) for i in range(workers)]
+    result = get_pool(workers).map_async(search_root, jobs)
+    while not result.ready():
+        if cancel is not None and cancel.is_set():
+            discard_pool(workers)
+            return {}
+        result.wait(0.05)
+    return merge_root_stats(result.get())
+
+
+def parallel_mcts(root_state, iterations=None, workers=None, time_limit=None, cancel=None, **options):
+    stats = parallel_root_stats(root_state, iterations, workers, time_limit, cancel, **options)
+    if not stats:
+        return None
+    return max(stats, key=lambda move: stats[move][0])
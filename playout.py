@@ -0,0 +1,46 @@
+import random
+from tables import FULL, WINS, CELLS, MOVES, WINNING_CELLS
+
+
+def heavy_move(state):
+    player = state.current_player
+    own = state.masks[player]
+    other = state.masks[state.player_just_moved]
+    empty = state.empty
+    open_boards = FULL ^ state.closed
+
+    b = state.next_board
+    if b is not None and state.board_winners[b] is None:
+        cells = empty[b]
+        wins = WINNING_CELLS[own[b]] & cells
+        if wins:
+            return random.choice(MOVES[b][wins])
+        blocks = WINNING_CELLS[other[b]] & cells
+        if blocks:
+            cells = blocks
+        return random.choice(MOVES[b][cells & open_boards or cells])
+
+    meta = state.meta[player]
+    wins = []
+    blocks = []
+    safe = []
+    for b in CELLS[open_boards]:
+        cells = empty[b]
+        mask = WINNING_CELLS[own[b]] & cells
+        if mask:
+            if WINS[meta | 1 << b]:
+                return random.choice(MOVES[b][mask])
+            wins.extend(MOVES[b][mask])
+        elif not wins:
+            mask = WINNING_CELLS[other[b]] & cells
+            if mask:
+                blocks.extend(MOVES[b][mask])
+            elif not blocks:
+                safe.extend(MOVES[b][cells & open_boards])
+    return random.choice(wins or blocks or safe or state.get_legal_moves())
+
+
+PLAYOUTS = {
+    "random": lambda state: state.random_move(),
+    "heavy": heavy_move,
+}
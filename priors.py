@@ -0,0 +1,117 @@
+import os
+import sys
+import struct
+import argparse
+from array import array
+from multiprocessing import Pool
+from tables import FULL, WINS, CELLS, WINNING_CELLS
+from bitboard import BitboardState
+from records import GameRecords
+
+MAGIC = b"UTTP"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxI")
+CONTEXTS = 3
+PATTERNS = 3 ** 9
+SIZE = PATTERNS * CONTEXTS * 9
+SMOOTHING = 20
+TERNARY = tuple(sum(3 ** c for c in CELLS[mask]) for mask in range(FULL + 1))
+
+
+def move_index(state, move):
+    b, c = move
+    own = state.masks[state.current_player]
+    other = state.masks[state.player_just_moved]
+    pattern = TERNARY[own[b]] + 2 * TERNARY[other[b]]
+
+    own_target = own[c] | (1 << c if b == c else 0)
+    empty_target = state.empty[c] & ~(1 << c if b == c else 0)
+    if state.closed >> c & 1 or WINS[own_target] or not empty_target:
+        context = 0
+    elif WINNING_CELLS[other[c]] & empty_target:
+        context = 1
+    else:
+        context = 2
+    return (pattern * CONTEXTS + context) * 9 + c
+
+
+class PatternPriors:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or count != SIZE:
+                raise ValueError(f"{path} is not a version {VERSION} prior table")
+            self.weights = array("f")
+            self.weights.fromfile(f, count)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def move_priors(self, state, moves):
+        weights = self.weights
+        scores = [weights[move_index(state, move)] for move in moves]
+        total = sum(scores)
+        return {move: score / total for move, score in zip(moves, scores)}
+
+
+def count_games(job):
+    path, start, stop = job
+    played = array("I", bytes(4 * SIZE))
+    seen = array("I", bytes(4 * SIZE))
+    with GameRecords(path) as records:
+        for index in range(start, stop):
+            moves, result, _ = records[index]
+            if result not in ("X", "O"):
+                continue
+            winner = 1 if result == "X" else 2
+            state = BitboardState()
+            for move in moves:
+                if state.current_player == winner:
+                    for legal in state.get_legal_moves():
+                        seen[move_index(state, legal)] += 1
+                    played[move_index(state, move)] += 1
+                state.make_move(move)
+    return played, seen
+
+
+def build_priors(records_path, out, workers=None, chunk=1000):
+    with GameRecords(records_path) as records:
+        games = len(records)
+    jobs = [(records_path, start, min(start + chunk, games)) for start in range(0, games, chunk)]
+    played = [0] * SIZE
+    seen = [0] * SIZE
+    with Pool(workers) as pool:
+        for done, (chunk_played, chunk_seen) in enumerate(pool.imap_unordered(count_games, jobs), 1):
+            for i in range(SIZE):
+                if chunk_seen[i]:
+                    played[i] += chunk_played[i]
+                    seen[i] += chunk_seen[i]
+            print(f"\r{min(done * chunk, games)}/{games} games", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+    base = sum(played) / sum(seen) if sum(seen) else 1.0
+    weights = array("f", ((p + SMOOTHING * base) / (s + SMOOTHING) for p, s in zip(played, seen)))
+    with open(out, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SIZE))
+        weights.tofile(f)
+    return sum(1 for s in seen if s)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build sub-board pattern priors from binary game records")
+    parser.add_argument("records", help="game record file written by tournament.py --record")
+    parser.add_argument("out")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    patterns = build_priors(args.records, args.out, args.workers)
+    print(f"wrote {args.out} with {patterns} observed patterns")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
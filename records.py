@@ -0,0 +1,244 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+from bitboard import BitboardState
+
+MAGIC = b"UTTG"
+VERSION = 1
+VISITS = 1
+HEADER = struct.Struct("<4sHH")
+GAME = struct.Struct("<BB")
+OFFSET = struct.Struct("<Q")
+INDEX_CHUNK = 65536
+RESULT_NAMES = (None, "X", "O", "D")
+RESULTS = {name: code for code, name in enumerate(RESULT_NAMES)}
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def game_size(moves, flags):
+    return GAME.size + moves * (5 if flags & VISITS else 1)
+
+
+def read_header(data, path):
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a game record file")
+    magic, version, flags = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} game record file")
+    return flags
+
+
+def build_index(path):
+    if os.path.getsize(path) < HEADER.size:
+        raise ValueError(f"{path} is not a game record file")
+    count = 0
+    offset = HEADER.size
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        flags = read_header(data, path)
+        size = len(data)
+        with open(index_path(path), "wb") as index:
+            chunk = []
+            while offset + GAME.size <= size:
+                end = offset + game_size(data[offset], flags)
+                if end > size:
+                    break
+                chunk.append(OFFSET.pack(offset))
+                offset = end
+                if len(chunk) == INDEX_CHUNK:
+                    index.write(b"".join(chunk))
+                    count += len(chunk)
+                    chunk = []
+            index.write(b"".join(chunk))
+            count += len(chunk)
+    return count, offset
+
+
+def index_is_current(path):
+    try:
+        index_size = os.path.getsize(index_path(path))
+    except OSError:
+        return False
+    size = os.path.getsize(path)
+    if index_size % OFFSET.size:
+        return False
+    if not index_size:
+        return size == HEADER.size
+    with open(path, "rb") as f:
+        flags = read_header(f.read(HEADER.size), path)
+        with open(index_path(path), "rb") as idx:
+            idx.seek(index_size - OFFSET.size)
+            offset = OFFSET.unpack(idx.read(OFFSET.size))[0]
+        f.seek(offset)
+        header = f.read(GAME.size)
+    return len(header) == GAME.size and offset + game_size(header[0], flags) == size
+
+
+class RecordWriter:
+    def __init__(self, path, visits=False):
+        self.path = path
+        self.flags = VISITS if visits else 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                flags = read_header(f.read(HEADER.size), path)
+            if flags != self.flags:
+                raise ValueError(f"{path} was written {'with' if flags & VISITS else 'without'} visit counts")
+            if not index_is_current(path):
+                _, end = build_index(path)
+                os.truncate(path, end)
+        else:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.flags))
+            open(index_path(path), "wb").close()
+        self.file = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        self.offset = self.file.tell()
+        self.count = self.index.tell() // OFFSET.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, moves, result, visits=None):
+        if len(moves) > 81:
+            raise ValueError("a game has at most 81 moves")
+        if self.flags & VISITS and (visits is None or len(visits) != len(moves)):
+            raise ValueError("this file needs one visit count per move")
+        record = GAME.pack(len(moves), RESULTS[result]) + bytes(b * 9 + c for b, c in moves)
+        if self.flags & VISITS:
+            record += struct.pack(f"<{len(moves)}I", *visits)
+        self.file.write(record)
+        self.index.write(OFFSET.pack(self.offset))
+        self.offset += len(record)
+        self.count += 1
+        return self.count - 1
+
+    def write_state(self, state, visits=None):
+        return self.write(state.moves, RESULT_NAMES[state.TOKENS.index(state.overall_winner)], visits)
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+class GameRecords:
+    def __init__(self, path):
+        self.path = path
+        if not index_is_current(path):
+            build_index(path)
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.flags = read_header(self.data, path)
+        self.index_file = open(index_path(path), "rb")
+        self.count = os.path.getsize(index_path(path)) // OFFSET.size
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.count:
+            self.index.close()
+        self.index_file.close()
+        self.data.close()
+        self.file.close()
+
+    def read(self, offset):
+        length, result = GAME.unpack_from(self.data, offset)
+        start = offset + GAME.size
+        moves = [divmod(move, 9) for move in self.data[start:start + length]]
+        visits = None
+        if self.flags & VISITS:
+            visits = list(struct.unpack_from(f"<{length}I", self.data, start + length))
+        return moves, RESULT_NAMES[result], visits
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("game index out of range")
+        return self.read(OFFSET.unpack_from(self.index, index * OFFSET.size)[0])
+
+    def __iter__(self):
+        offset = HEADER.size
+        for _ in range(self.count):
+            game = self.read(offset)
+            offset += game_size(len(game[0]), self.flags)
+            yield game
+
+    def replay(self, index):
+        state = BitboardState()
+        for move in self[index][0]:
+            state.make_move(move)
+        return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or re-index a binary game record file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats = commands.add_parser("stats", help="count games, results and moves")
+    stats.add_argument("records")
+
+    show = commands.add_parser("show", help="print one game")
+    show.add_argument("records")
+    show.add_argument("game", type=int)
+
+    index = commands.add_parser("index", help="rebuild the offset index")
+    index.add_argument("records")
+
+    args = parser.parse_args(argv)
+    if args.command == "index":
+        count, end = build_index(args.records)
+        print(f"indexed {count} games")
+        if end != os.path.getsize(args.records):
+            print(f"ignoring {os.path.getsize(args.records) - end} trailing bytes of an incomplete game")
+        return 0
+
+    with GameRecords(args.records) as records:
+        if args.command == "show":
+            moves, result, visits = records[args.game]
+            print(" ".join(str(b * 9 + c) for b, c in moves))
+            if visits is not None:
+                print("visits " + " ".join(map(str, visits)))
+            print(f"result {result or 'unfinished'}")
+            return 0
+
+        results = dict.fromkeys("XOD", 0)
+        unfinished = moves = 0
+        for game_moves, result, _ in records:
+            moves += len(game_moves)
+            if result is None:
+                unfinished += 1
+            else:
+                results[result] += 1
+        games = len(records)
+    print(f"{games} games, {moves} moves ({moves / games if games else 0:.1f} per game)")
+    print(f"X {results['X']}, O {results['O']}, D {results['D']}, unfinished {unfinished}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
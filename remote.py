@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+import subprocess
+from collections import deque
+
+ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine.py")
+
+
+class SearchJob:
+    def __init__(self, engine, position_id):
+        self.engine = engine
+        self.position_id = position_id
+        self.progress = {}
+        self.result = None
+        self.cancelled = False
+        self.finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def cancel(self):
+        self.engine.cancel(self)
+
+
+class EngineProcess:
+    def __init__(self, *args):
+        self.args = args
+        self.jobs = deque()
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        self.exited = False
+        self.process = subprocess.Popen(
+            [sys.executable, ENGINE_PATH, *self.args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self.reader = threading.Thread(target=self.read, args=(self.process,), daemon=True)
+        self.reader.start()
+
+    def finish_jobs(self):
+        while self.jobs:
+            self.jobs.popleft().finished.set()
+
+    def send(self, *lines):
+        try:
+            self.process.stdin.write("".join(line + "\n" for line in lines))
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def read(self, process):
+        for line in process.stdout:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "info":
+                with self.lock:
+                    if self.jobs and process is self.process:
+                        self.jobs[0].progress = {
+                            key: int(value) if value.isdigit() else value
+                            for key, value in zip(words[1::2], words[2::2])
+                        }
+            elif words[0] == "bestmove":
+                with self.lock:
+                    job = self.jobs.popleft() if self.jobs and process is self.process else None
+                if job is None:
+                    continue
+                fields = dict(zip(words[2::2], words[3::2]))
+                if not job.cancelled and words[1] != "none" and fields.get("key") == str(job.position_id):
+                    job.result = divmod(int(words[1]), 9)
+                job.finished.set()
+
+        with self.lock:
+            if process is self.process:
+                self.exited = True
+                self.finish_jobs()
+
+    def search(self, state, iterations=None, time_limit=None):
+        moves = " ".join(str(b * 9 + c) for (b, c), *_ in state.history)
+        go = "go"
+        if iterations is not None:
+            go += f" iterations {iterations}"
+        if time_limit is not None:
+            go += f" movetime {int(time_limit * 1000)}"
+        if iterations is None and time_limit is None:
+            go += " infinite"
+
+        job = SearchJob(self, state.key())
+        with self.lock:
+            if self.exited or self.process.poll() is not None:
+                self.finish_jobs()
+                self.start()
+            self.jobs.append(job)
+            self.send(f"position startpos moves {moves}", go)
+        return job
+
+    def cancel(self, job):
+        with self.lock:
+            if job.done or job.cancelled:
+                return
+            job.cancelled = True
+            if self.jobs and self.jobs[-1] is job:
+                self.send("stop")
+
+    def new_game(self):
+        with self.lock:
+            for job in self.jobs:
+                job.cancelled = True
+            self.send("stop", "newgame")
+
+    def close(self):
+        self.send("quit")
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
@@ -0,0 +1,77 @@
+import pygame
+
+CACHE_LIMIT = 1024
+
+text_cache = {}
+outlined_cache = {}
+fill_cache = {}
+
+
+def cached(cache, key, build):
+    surf = cache.get(key)
+    if surf is None:
+        if len(cache) >= CACHE_LIMIT:
+            cache.clear()
+        surf = cache[key] = build()
+    return surf
+
+
+def render_text(font, text, color):
+    return cached(text_cache, (font, text, color), lambda: font.render(text, True, color))
+
+
+def render_outlined_text(font, text, color, outline_color, outline_width=2):
+    def build():
+        outline = font.render(text, True, outline_color)
+        surf = pygame.Surface(
+            (outline.get_width() + 2 * outline_width, outline.get_height() + 2 * outline_width),
+            pygame.SRCALPHA,
+        )
+        for dx in range(-outline_width, outline_width + 1):
+            for dy in range(-outline_width, outline_width + 1):
+                if dx or dy:
+                    surf.blit(outline, (outline_width + dx, outline_width + dy))
+        surf.blit(font.render(text, True, color), (outline_width, outline_width))
+        return surf
+
+    return cached(outlined_cache, (font, text, color, outline_color, outline_width), build)
+
+
+def filled_surface(size, color):
+    def build():
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        surf.fill(color)
+        return surf
+
+    return cached(fill_cache, (size, color), build)
+
+
+class DirtyRegions:
+    def __init__(self, regions):
+        self.regions = regions
+        self.signatures = {}
+
+    def invalidate(self):
+        self.signatures.clear()
+
+    def dirty(self, signatures):
+        rects = []
+        for name, signature in signatures.items():
+            if name not in self.signatures or self.signatures[name] != signature:
+                self.signatures[name] = signature
+                rects.append(self.regions[name])
+        return rects
+
+    def redraw(self, surf, signatures, draw):
+        rects = self.dirty(signatures)
+        if len(rects) == len(self.regions):
+            draw()
+            pygame.display.flip()
+            return rects
+        for rect in rects:
+            surf.set_clip(rect)
+            draw()
+        surf.set_clip(None)
+        if rects:
+            pygame.display.update(rects)
+        return rects
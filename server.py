@@ -0,0 +1,386 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import signal
+import asyncio
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from game import MCTS, SearchStats
+from bitboard import BitboardState
+
+
+def worker_main(conn, options, seed):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed(seed)
+    sessions = {}
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        if message[0] == "close":
+            sessions.pop(message[1], None)
+            continue
+
+        _, session, moves, iterations, time_limit = message
+        try:
+            engine, played = sessions.pop(session, None) or (MCTS(**options), [])
+            if moves[:len(played)] == played:
+                for move in moves[len(played):]:
+                    engine.advance(move)
+            state = BitboardState()
+            for move in moves:
+                state.make_move(move)
+
+            stats = SearchStats()
+            start = time.perf_counter()
+            move = engine.search(state, iterations, time_limit, stats=stats)
+        except Exception as error:
+            conn.send({"error": f"search failed: {error}"})
+            continue
+        sessions[session] = (engine, list(moves))
+        conn.send({
+            "move": None if move is None else move[0] * 9 + move[1],
+            "iterations": stats.iterations,
+            "seconds": round(time.perf_counter() - start, 4),
+        })
+
+
+class FairQueue:
+    def __init__(self):
+        self.jobs = {}
+        self.order = deque()
+        self.ready = asyncio.Event()
+        self.size = 0
+
+    def put(self, session, job):
+        if session not in self.jobs:
+            self.jobs[session] = deque()
+            self.order.append(session)
+        self.jobs[session].append(job)
+        self.size += 1
+        self.ready.set()
+
+    async def get(self):
+        while not self.order:
+            self.ready.clear()
+            await self.ready.wait()
+        session = self.order.popleft()
+        jobs = self.jobs[session]
+        job = jobs.popleft()
+        self.size -= 1
+        if jobs:
+            self.order.append(session)
+        else:
+            del self.jobs[session]
+        return job
+
+
+class Worker:
+    def __init__(self, index, options, seed):
+        self.index = index
+        self.options = options
+        self.seed = seed
+        self.queue = FairQueue()
+        self.sessions = 0
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=worker_main, args=(child_conn, self.options, self.seed), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+
+    def restart(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        try:
+            self.start()
+        except OSError:
+            self.alive = False
+
+    async def dispatch(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            message, future = await self.queue.get()
+            reply = {"error": "worker process exited"}
+            if self.alive:
+                try:
+                    self.conn.send(message)
+                    if future is not None:
+                        reply = await loop.run_in_executor(executor, self.conn.recv)
+                except (EOFError, OSError):
+                    self.restart()
+                    reply = {"error": "worker process restarted", "retry": True}
+            if future is not None and not future.done():
+                future.set_result(reply)
+
+    def shutdown(self):
+        if self.alive:
+            self.conn.send(None)
+        self.process.join()
+
+
+class GameServer:
+    def __init__(self, workers=None, max_queue=256, max_time=5.0, max_inflight=8, seed=0, **options):
+        self.workers = [Worker(index, options, seed + index) for index in range(workers or os.cpu_count() or 1)]
+        self.max_queue = max_queue
+        self.max_time = max_time
+        self.max_inflight = max_inflight
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.ops = {
+            "new": self.on_new,
+            "move": self.on_move,
+            "search": self.on_search,
+            "state": self.on_state,
+            "close": self.on_close,
+        }
+
+    async def serve(self, host="127.0.0.1", port=8765, ready=None):
+        executor = ThreadPoolExecutor(len(self.workers))
+        dispatchers = [asyncio.create_task(worker.dispatch(executor)) for worker in self.workers]
+        server = await asyncio.start_server(self.handle_client, host, port)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in dispatchers:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            for worker in self.workers:
+                worker.shutdown()
+
+    async def handle_client(self, reader, writer):
+        inflight = asyncio.Semaphore(self.max_inflight)
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                await inflight.acquire()
+                task = asyncio.create_task(self.respond(line, writer, inflight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def respond(self, line, writer, inflight):
+        request = {}
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("requests must be JSON objects")
+                op = self.ops.get(request.get("op"))
+                if op is None:
+                    raise ValueError(f"unknown op {request.get('op')!r}")
+                reply = await op(request)
+            except (ValueError, TypeError) as error:
+                request = request if isinstance(request, dict) else {}
+                reply = {"error": str(error)}
+            if "id" in request:
+                reply["id"] = request["id"]
+            writer.write((json.dumps(reply) + "\n").encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            inflight.release()
+
+    def session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise ValueError(f"unknown session {request.get('session')!r}")
+        return session
+
+    def live_worker(self):
+        workers = [worker for worker in self.workers if worker.alive]
+        if not workers:
+            raise ValueError("no worker processes are running")
+        return min(workers, key=lambda worker: worker.sessions)
+
+    def describe(self, session_id):
+        session = self.sessions[session_id]
+        state = session["state"]
+        return {
+            "session": session_id,
+            "position": state.to_compact(),
+            "moves": [b * 9 + c for b, c in session["moves"]],
+            "winner": state.MARKS[state.overall_winner] if state.is_terminal() else None,
+        }
+
+    def play(self, session, value):
+        state = session["state"]
+        move = divmod(int(value), 9)
+        if state.is_terminal() or move not in state.get_legal_moves():
+            raise ValueError(f"illegal move {value}")
+        state.make_move(move)
+        session["moves"].append(move)
+
+    async def on_new(self, request):
+        session_id = str(next(self.session_ids))
+        worker = self.live_worker()
+        worker.sessions += 1
+        self.sessions[session_id] = {"state": BitboardState(), "moves": [], "worker": worker}
+        return self.describe(session_id)
+
+    async def on_move(self, request):
+        self.play(self.session(request), request.get("move"))
+        return self.describe(request["session"])
+
+    async def on_state(self, request):
+        self.session(request)
+        return self.describe(request["session"])
+
+    async def on_close(self, request):
+        session = self.session(request)
+        del self.sessions[request["session"]]
+        session["worker"].sessions -= 1
+        session["worker"].queue.put(request["session"], (("close", request["session"]), None))
+        return {"session": request["session"], "closed": True}
+
+    async def on_search(self, request):
+        session = self.session(request)
+        if session["state"].is_terminal():
+            raise ValueError("game is over")
+        if sum(worker.queue.size for worker in self.workers) >= self.max_queue:
+            return {"error": "busy", "retry": True}
+
+        iterations = request.get("iterations")
+        if iterations is not None and (type(iterations) is not int or iterations <= 0):
+            raise ValueError("iterations must be a positive integer")
+        time_limit = request.get("time")
+        if time_limit is None:
+            time_limit = self.max_time
+        elif type(time_limit) not in (int, float) or not math.isfinite(time_limit) or time_limit <= 0:
+            raise ValueError("time must be a positive number of seconds")
+        else:
+            time_limit = min(float(time_limit), self.max_time)
+        if not session["worker"].alive:
+            worker = self.live_worker()
+            session["worker"].sessions -= 1
+            worker.sessions += 1
+            session["worker"] = worker
+        key = session["state"].key()
+        future = asyncio.get_running_loop().create_future()
+        message = ("search", request["session"], list(session["moves"]), iterations, time_limit)
+        session["worker"].queue.put(request["session"], (message, future))
+        reply = await future
+
+        if "error" in reply:
+            return reply
+        if request.get("play") and reply["move"] is not None:
+            if self.sessions.get(request["session"]) is not session or session["state"].key() != key:
+                raise ValueError("position changed during search")
+            self.play(session, reply["move"])
+            reply.update(self.describe(request["session"]))
+        return reply
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def listen(self):
+        while line := await self.reader.readline():
+            reply = json.loads(line)
+            future = self.pending.pop(reply.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(reply)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write((json.dumps({"id": request_id, "op": op, **fields}) + "\n").encode())
+        await self.writer.drain()
+        reply = await future
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+
+
+async def self_play(client, time_limit, iterations):
+    game = await client.request("new")
+    while game["winner"] is None:
+        game = await client.request(
+            "search", session=game["session"], time=time_limit, iterations=iterations, play=True
+        )
+    await client.request("close", session=game["session"])
+    return game["winner"]
+
+
+async def run_self_play(host, port, games, time_limit, iterations):
+    client = await Client.connect(host, port)
+    start = time.perf_counter()
+    winners = await asyncio.gather(*(self_play(client, time_limit, iterations) for _ in range(games)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    print(f"{games} games in {elapsed:.1f}s: " + ", ".join(f"{w} {winners.count(w)}" for w in "XOD"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local multi-game server with a shared search worker pool")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve.add_argument("--max-queue", type=int, default=256, help="queued searches before requests are refused")
+    serve.add_argument("--max-time", type=float, default=5.0, help="upper bound on a search's time budget")
+    serve.add_argument("--max-inflight", type=int, default=8, help="unanswered requests per connection")
+    serve.add_argument("--playout", default="random", choices=("random", "heavy"))
+
+    play = commands.add_parser("selfplay", help="play concurrent games against a running server")
+    play.add_argument("--host", default="127.0.0.1")
+    play.add_argument("--port", type=int, default=8765)
+    play.add_argument("--games", type=int, default=8)
+    play.add_argument("--time", type=float, default=0.1)
+    play.add_argument("--iterations", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        server = GameServer(
+            args.workers, args.max_queue, args.max_time, args.max_inflight, playout=args.playout
+        )
+        try:
+            asyncio.run(server.serve(args.host, args.port, lambda _: print(f"listening on {args.host}:{args.port}", flush=True)))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(run_self_play(args.host, args.port, args.games, args.time, args.iterations))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import time
+from tables import FULL, WINS, POPCOUNT, CELLS
+
+EXACT, LOWER, UPPER = 0, 1, 2
+CHECK_INTERVAL = 1024
+
+
+class SolverAborted(Exception):
+    pass
+
+
+class Budget:
+    def __init__(self, deadline=None, cancel=None):
+        self.deadline = deadline
+        self.cancel = cancel
+        self.nodes = 0
+
+    def check(self):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL:
+            return
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SolverAborted
+        if self.cancel is not None and self.cancel.is_set():
+            raise SolverAborted
+
+
+def empty_cells(state):
+    empty = state.empty
+    return sum(POPCOUNT[empty[b]] for b in CELLS[FULL ^ state.closed])
+
+
+def ordered_moves(state):
+    masks = state.masks[state.current_player]
+    moves = state.get_legal_moves()
+    moves.sort(key=lambda move: not WINS[masks[move[0]] | 1 << move[1]])
+    return moves
+
+
+def negamax(state, alpha, beta, table, budget=None):
+    if budget is not None:
+        budget.check()
+    if state.is_terminal():
+        return -1 if state.overall_winner == state.player_just_moved else 0
+
+    key = state.key()
+    entry = table.get(key)
+    if entry is not None:
+        value, flag = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER and value >= beta:
+            return value
+        if flag == UPPER and value <= alpha:
+            return value
+
+    original_alpha = alpha
+    best = -1
+    for move in ordered_moves(state):
+        state.make_move(move)
+        value = -negamax(state, -beta, -alpha, table, budget)
+        state.unmake_move()
+        if value > best:
+            best = value
+            if best > alpha:
+                alpha = best
+                if alpha >= beta:
+                    break
+
+    if best <= original_alpha:
+        table[key] = (best, UPPER)
+    elif best >= beta:
+        table[key] = (best, LOWER)
+    else:
+        table[key] = (best, EXACT)
+    return best
+
+
+def solve(state, table=None, deadline=None, cancel=None):
+    budget = None if deadline is None and cancel is None else Budget(deadline, cancel)
+    return negamax(state, -1, 1, {} if table is None else table, budget)
+
+
+def solve_move(state, table=None, deadline=None, cancel=None):
+    table = {} if table is None else table
+    budget = None if deadline is None and cancel is None else Budget(deadline, cancel)
+    best_move = None
+    best = -2
+    for move in ordered_moves(state):
+        state.make_move(move)
+        value = -negamax(state, -1, -max(best, -1), table, budget)
+        state.unmake_move()
+        if value > best:
+            best_move = move
+            best = value
+            if best == 1:
+                break
+    return best_move, best
@@ -0,0 +1,42 @@
+import random
+
+FULL = 0x1FF
+
+LINES = tuple(
+    (1 << a) | (1 << b) | (1 << c)
+    for a, b, c in (
+        (0, 1, 2), (3, 4, 5), (6, 7, 8),
+        (0, 3, 6), (1, 4, 7), (2, 5, 8),
+        (0, 4, 8), (2, 4, 6)
+    )
+)
+
+WINS = bytes(any(mask & line == line for line in LINES) for mask in range(FULL + 1))
+
+POPCOUNT = bytes(bin(mask).count("1") for mask in range(FULL + 1))
+
+WINNING_CELLS = tuple(sum(1 << c for c in range(9) if WINS[mask | 1 << c]) for mask in range(FULL + 1))
+
+CELLS = tuple(tuple(i for i in range(9) if mask >> i & 1) for mask in range(FULL + 1))
+MOVES = tuple(
+    tuple(tuple((b, c) for c in cells) for cells in CELLS)
+    for b in range(9)
+)
+
+zobrist_rng = random.Random(0x5EED)
+ZOBRIST_X = tuple(tuple(zobrist_rng.getrandbits(64) for _ in range(9)) for _ in range(9))
+ZOBRIST_O = tuple(tuple(zobrist_rng.getrandbits(64) for _ in range(9)) for _ in range(9))
+ZOBRIST_SIDE = zobrist_rng.getrandbits(64)
+ZOBRIST_NEXT = {b: zobrist_rng.getrandbits(64) for b in (None, *range(9))}
+
+
+def zobrist_hash(x_masks, o_masks, o_to_move, next_board):
+    h = ZOBRIST_NEXT[next_board]
+    if o_to_move:
+        h ^= ZOBRIST_SIDE
+    for b in range(9):
+        for c in CELLS[x_masks[b]]:
+            h ^= ZOBRIST_X[b][c]
+        for c in CELLS[o_masks[b]]:
+            h ^= ZOBRIST_O[b][c]
+    return h
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from game import MCTS
+from bitboard import BitboardState
+from book import OpeningBook
+from records import RecordWriter
+from priors import PatternPriors
+
+OPTION_TYPES = {
+    "iterations": ("iterations", int),
+    "time": ("time_limit", float),
+    "c": ("exploration", float),
+    "backend": ("backend", str),
+    "batch": ("batch_size", int),
+    "table": ("table_size", int),
+    "book": ("book", OpeningBook),
+    "solve": ("solve_below", int),
+    "playout": ("playout", str),
+    "rave": ("rave_k", float),
+    "priors": ("priors", PatternPriors),
+    "workers": ("workers", int),
+}
+
+
+def parse_engine(spec):
+    name, _, options = spec.partition(":")
+    config = {"name": name, "iterations": None, "time_limit": None, "options": {}}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in OPTION_TYPES:
+            raise ValueError(f"unknown engine option {key!r} in {spec!r}")
+        field, convert = OPTION_TYPES[key]
+        if field in ("iterations", "time_limit"):
+            config[field] = convert(value)
+        else:
+            config["options"][field] = convert(value)
+    if config["iterations"] is None and config["time_limit"] is None:
+        raise ValueError(f"engine {name!r} needs iterations= or time=")
+    return config
+
+
+def play_game(job):
+    index, x_config, o_config, seed = job
+    random.seed(seed)
+    state = BitboardState()
+    engines = {1: MCTS(**x_config["options"]), 2: MCTS(**o_config["options"])}
+    configs = {1: x_config, 2: o_config}
+    search_time = {1: 0.0, 2: 0.0}
+    visits = []
+
+    while not state.is_terminal():
+        player = state.current_player
+        config = configs[player]
+        engine = engines[player]
+        start = time.perf_counter()
+        move = engine.search(state, config["iterations"], config["time_limit"])
+        search_time[player] += time.perf_counter() - start
+        root = engine.root
+        visits.append(root.visits if root is not None and root.key == state.key() else 0)
+        state.make_move(move)
+        for engine in engines.values():
+            engine.advance(move)
+
+    return {
+        "game": index,
+        "x": x_config["name"],
+        "o": o_config["name"],
+        "result": state.MARKS[state.overall_winner],
+        "moves": [b * 9 + c for b, c in state.moves],
+        "visits": visits,
+        "x_seconds": round(search_time[1], 3),
+        "o_seconds": round(search_time[2], 3),
+    }
+
+
+def make_jobs(engines, games, seed):
+    index = 0
+    for first, second in itertools.combinations(engines, 2):
+        for game in range(games):
+            x_config, o_config = (first, second) if game % 2 == 0 else (second, first)
+            yield index, x_config, o_config, seed + index
+            index += 1
+
+
+def score_to_elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_summary(wins, draws, losses):
+    games = wins + draws + losses
+    if not games:
+        return None
+    score = (wins + draws / 2) / games
+    z = 1.96
+    spread = z * z / games
+    center = (score + spread / 2) / (1 + spread)
+    margin = z * math.sqrt(score * (1 - score) / games + spread / (4 * games)) / (1 + spread)
+    return {
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": score,
+        "elo": score_to_elo(score),
+        "elo_low": score_to_elo(center - margin),
+        "elo_high": score_to_elo(center + margin),
+    }
+
+
+class Standings:
+    def __init__(self, engines):
+        self.pairs = {
+            (first["name"], second["name"]): [0, 0, 0]
+            for first, second in itertools.combinations(engines, 2)
+        }
+
+    def add(self, record):
+        pair = (record["x"], record["o"]) if (record["x"], record["o"]) in self.pairs else (record["o"], record["x"])
+        winner = {"X": record["x"], "O": record["o"]}.get(record["result"])
+        counts = self.pairs[pair]
+        if winner is None:
+            counts[1] += 1
+        elif winner == pair[0]:
+            counts[0] += 1
+        else:
+            counts[2] += 1
+
+    def summary(self):
+        return {f"{first} vs {second}": elo_summary(*counts) for (first, second), counts in self.pairs.items()}
+
+
+def print_summary(standings, done, elapsed):
+    rate = done / elapsed * 3600 if elapsed else 0.0
+    print(f"{done} games in {elapsed:.1f}s ({rate:,.0f} games/hour)")
+    for pair, stats in standings.summary().items():
+        if stats is None:
+            continue
+        print(
+            f"  {pair}: +{stats['wins']} ={stats['draws']} -{stats['losses']}"
+            f"  Elo {stats['elo']:+.0f} [{stats['elo_low']:+.0f}, {stats['elo_high']:+.0f}]"
+        )
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless self-play tournament between engine configurations")
+    parser.add_argument(
+        "--engine", action="append", required=True, metavar="NAME:KEY=VALUE,...",
+        help="engine configuration, e.g. fast:iterations=200 or slow:time=0.5,c=1.0,backend=numpy "
+        "(keys: iterations, time, c, backend, batch, table, book, solve, playout, rave, priors, workers)",
+    )
+    parser.add_argument("--games", type=int, default=100, help="games per pairing")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", help="append one JSON line per finished game to this file")
+    parser.add_argument("--record", help="append finished games with per-move root visit counts to this binary record file")
+    parser.add_argument("--report-every", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    try:
+        engines = [parse_engine(spec) for spec in args.engine]
+    except ValueError as error:
+        parser.error(str(error))
+    if len(engines) < 2:
+        parser.error("at least two --engine configurations are required")
+    if len({engine["name"] for engine in engines}) != len(engines):
+        parser.error("engine names must be unique")
+
+    standings = Standings(engines)
+    results = open(args.results, "a") if args.results else None
+    recorder = RecordWriter(args.record, visits=True) if args.record else None
+    start = time.perf_counter()
+    done = 0
+    try:
+        with ProcessPoolExecutor(args.workers) as pool:
+            games = [pool.submit(play_game, job) for job in make_jobs(engines, args.games, args.seed)]
+            for game in as_completed(games):
+                record = game.result()
+                standings.add(record)
+                done += 1
+                if results is not None:
+                    results.write(json.dumps(record) + "\n")
+                    results.flush()
+                if recorder is not None:
+                    recorder.write([divmod(move, 9) for move in record["moves"]], record["result"], record["visits"])
+                if done % args.report_every == 0:
+                    print_summary(standings, done, time.perf_counter() - start)
+    finally:
+        if results is not None:
+            results.close()
+        if recorder is not None:
+            recorder.close()
+
+    print_summary(standings, done, time.perf_counter() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import math
+import time
+import random
+from array import array
+
+COLUMNS = (
+    ("visits", "I"),
+    ("wins", "I"),
+    ("parent", "i"),
+    ("first_child", "i"),
+    ("child_count", "B"),
+    ("tried", "B"),
+    ("move", "B"),
+)
+
+
+class FlatTree:
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.zeros = {typecode: array(typecode, [0] * 81) for _, typecode in COLUMNS}
+        self.add_nodes(-1, [0])
+
+    def __len__(self):
+        return len(self.visits)
+
+    def add_nodes(self, parent, moves):
+        count = len(moves)
+        first = len(self.visits)
+        self.visits.extend(self.zeros["I"][:count])
+        self.wins.extend(self.zeros["I"][:count])
+        self.parent.extend(array("i", [parent]) * count)
+        self.first_child.extend(array("i", [-1]) * count)
+        self.child_count.extend(self.zeros["B"][:count])
+        self.tried.extend(self.zeros["B"][:count])
+        self.move.extend(array("B", moves))
+        return first
+
+    def expand(self, node, state):
+        moves = [] if state.is_terminal() else [b * 9 + c for b, c in state.get_legal_moves()]
+        random.shuffle(moves)
+        self.first_child[node] = self.add_nodes(node, moves)
+        self.child_count[node] = len(moves)
+
+    def children(self, node):
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node]) if first >= 0 else range(0)
+
+    def uct_select_child(self, node, exploration=math.sqrt(2)):
+        visits = self.visits
+        wins = self.wins
+        log_visits = math.log(visits[node])
+        best_child = -1
+        best_score = -1.0
+        for child in self.children(node):
+            child_visits = visits[child]
+            score = wins[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if score > best_score:
+                best_child = child
+                best_score = score
+        return best_child
+
+    def select_leaf(self, state, exploration=math.sqrt(2)):
+        node = 0
+        path = [0]
+        while True:
+            if self.first_child[node] < 0:
+                self.expand(node, state)
+            count = self.child_count[node]
+            if count == 0:
+                return path
+
+            tried = self.tried[node]
+            if tried < count:
+                self.tried[node] = tried + 1
+                child = self.first_child[node] + tried
+                state.make_move(divmod(self.move[child], 9))
+                path.append(child)
+                return path
+
+            node = self.uct_select_child(node, exploration)
+            state.make_move(divmod(self.move[node], 9))
+            path.append(node)
+
+    def best_move(self):
+        children = self.children(0)
+        if not children:
+            return None
+        return divmod(self.move[max(children, key=self.visits.__getitem__)], 9)
+
+    def memory_report(self):
+        columns = {name: len(getattr(self, name)) * getattr(self, name).itemsize for name, _ in COLUMNS}
+        total = sum(columns.values())
+        return {
+            "nodes": len(self),
+            "visited_nodes": sum(1 for visits in self.visits if visits),
+            "bytes": total,
+            "bytes_per_node": total / len(self),
+            "columns": columns,
+        }
+
+
+def flat_search_tree(root_state, iterations=None, time_limit=None, cancel=None, exploration=math.sqrt(2)):
+    if iterations is None and time_limit is None and cancel is None:
+        raise ValueError("search needs an iteration count, a time limit or a cancel token")
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+
+    tree = FlatTree()
+    state = root_state.clone()
+    root_depth = len(state.history)
+    movers = (state.player_just_moved, state.current_player)
+    visits = tree.visits
+    wins = tree.wins
+
+    done = 0
+    while iterations is None or done < iterations:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if cancel is not None and cancel.is_set():
+            break
+
+        path = tree.select_leaf(state, exploration)
+
+        while not state.is_terminal():
+            state.make_move(state.random_move())
+
+        result = state.overall_winner
+        for depth, node in enumerate(path):
+            visits[node] += 1
+            if result == movers[depth & 1]:
+                wins[node] += 1
+
+        while len(state.history) > root_depth:
+            state.unmake_move()
+        done += 1
+
+    return tree
+
+
+def flat_mcts(root_state, iterations=None, time_limit=None, cancel=None, exploration=math.sqrt(2)):
+    return flat_search_tree(root_state, iterations, time_limit, cancel, exploration).best_move()
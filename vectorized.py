@@ -0,0 +1,68 @@
+import numpy as np
+from tables import FULL, LINES
+
+BITS = np.array([[mask >> i & 1 for i in range(9)] for mask in range(FULL + 1)], dtype=np.int8)
+LINE_CELLS = np.array([[i for i in range(9) if line >> i & 1] for line in LINES], dtype=np.intp)
+
+
+def encode_states(states):
+    x_token, o_token = states[0].TOKENS[1], states[0].TOKENS[2]
+    codes = {token: code for code, token in enumerate(states[0].TOKENS)}
+    masks = np.array([state.masks[x_token] + state.masks[o_token] for state in states], dtype=np.intp)
+    cells = BITS[masks[:, :9]] + 2 * BITS[masks[:, 9:]]
+    winners = np.array([[codes[w] for w in state.board_winners] for state in states], dtype=np.int8)
+    next_board = np.array(
+        [-1 if state.next_board is None else state.next_board for state in states], dtype=np.intp
+    )
+    player = np.array([codes[state.current_player] for state in states], dtype=np.int8)
+    overall = np.array([codes[state.overall_winner] for state in states], dtype=np.int8)
+    return cells, winners, next_board, player, overall
+
+
+def lines_won(boards, player):
+    return (boards[:, LINE_CELLS] == player[:, None, None]).all(axis=2).any(axis=1)
+
+
+def batch_playout(cells, winners, next_board, player, overall, rng):
+    overall = overall.copy()
+    active = np.nonzero(overall == 0)[0]
+    c = cells[active].reshape(-1, 81)
+    w = winners[active]
+    nb = next_board[active]
+    p = player[active]
+    board_ids = np.arange(9)
+
+    while active.size:
+        n = active.size
+        rows = np.arange(n)
+        allowed = np.where((nb >= 0)[:, None], board_ids[None, :] == nb[:, None], w == 0)
+        legal = (c == 0) & np.repeat(allowed, 9, axis=1)
+        counts = legal.sum(axis=1)
+        picks = (rng.random(n) * counts).astype(np.int8)
+        choice = (legal.cumsum(axis=1, dtype=np.int8) > picks[:, None]).argmax(axis=1)
+        b = choice // 9
+        cell = choice - 9 * b
+
+        c[rows, choice] = p
+        board = c.reshape(n, 9, 9)[rows, b]
+        w[rows, b] = np.where(lines_won(board, p), p, np.where((board != 0).all(axis=1), 3, 0))
+        game = np.where(lines_won(w, p), p, np.where((w != 0).all(axis=1), 3, 0))
+        nb = np.where(w[rows, cell] == 0, cell, -1)
+        p = 3 - p
+
+        finished = game != 0
+        if finished.any():
+            overall[active[finished]] = game[finished]
+            running = ~finished
+            active = active[running]
+            c = c[running]
+            w = w[running]
+            nb = nb[running]
+            p = p[running]
+
+    return overall
+
+
+def playout(states, rng):
+    tokens = states[0].TOKENS
+    return [tokens[code] for code in batch_playout(*encode_states(states), rng)]